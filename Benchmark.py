@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+from argparse import ArgumentParser
+from base64 import b64encode
+from datetime import datetime, timedelta
+import http.client
+from importlib.util import find_spec
+import json
+import logging
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+from tempfile import mkdtemp
+from threading import Thread
+from time import perf_counter, sleep
+
+from com.novikov.rfid import __version__
+from com.novikov.rfid.AccessLevel import AccessLevel
+from com.novikov.rfid.UserModel import UserModel
+
+
+__author__ = 'Ilia Novikov'
+
+
+class Benchmark:
+    # Замеры путей "карта - решение - дверь" и веб-интерфейса на синтетических данных.
+    # Результаты выводятся в JSON, чтобы сравнивать их между выпусками
+    SECTIONS = ['db', 'http', 'logs', 'policy', 'serial']
+    DATABASE = 'rfid_benchmark'
+    PASSWORD = 'benchmark'
+    CARD_FORMAT = '{:010d}'
+    SEED_BATCH = 10000
+    DEEP_PAGES = 50
+
+    def __init__(self, args):
+        self.args = args
+        self.logger = logging.getLogger('rfid.benchmark')
+        self.root = os.path.dirname(os.path.abspath(__file__))
+        self.cwd = os.getcwd()
+        # Логи и шаблоны открываются по относительным путям: работаем во временном каталоге со ссылкой на www
+        self.workdir = mkdtemp(prefix='rfid-benchmark-')
+        os.symlink(os.path.join(self.root, 'www'), os.path.join(self.workdir, 'www'))
+        os.mkdir(os.path.join(self.workdir, 'logs'))
+        os.chdir(self.workdir)
+        self.client = None
+        if args.mongomock:
+            # Необязательная зависимость, нужна только для работы без сервера MongoDB
+            import mongomock
+            self.client = mongomock.MongoClient()
+        self.results = {
+            'version': __version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': datetime.now().isoformat(),
+            'backend': 'mongomock' if args.mongomock else 'mongodb://{}:{}'.format(args.host, args.port),
+            'iterations': args.iterations,
+            'budget_s': args.budget
+        }
+
+    def run(self):
+        try:
+            if 'db' in self.args.sections or 'http' in self.args.sections:
+                self.results['users'] = {str(x): self.__run_users(x) for x in self.args.sizes}
+            if 'logs' in self.args.sections:
+                self.results['logs'] = {str(x): self.__run_logs(x) for x in self.args.log_lines}
+            if 'policy' in self.args.sections:
+                self.results['policy'] = self.__run_policy()
+            if 'serial' in self.args.sections:
+                self.results['serial'] = self.__run_serial()
+        finally:
+            os.chdir(self.cwd)
+            shutil.rmtree(self.workdir, ignore_errors=True)
+        return self.results
+
+    # region Замеры
+
+    def __measure(self, action, arguments):
+        # Каждый случай ограничен числом повторов и временем, чтобы большие наборы не шли часами
+        timings = []
+        deadline = perf_counter() + self.args.budget
+        for argument in arguments:
+            start = perf_counter()
+            action(argument)
+            timings.append(perf_counter() - start)
+            if len(timings) >= self.args.iterations or perf_counter() > deadline:
+                break
+        return self.__summarize(timings)
+
+    @staticmethod
+    def __summarize(timings):
+        if not timings:
+            return {'count': 0}
+        timings = sorted(timings)
+        percentile = lambda x: timings[min(len(timings) - 1, int(len(timings) * x))] * 1000
+        return {
+            'count': len(timings),
+            'mean_ms': round(sum(timings) / len(timings) * 1000, 4),
+            'p50_ms': round(percentile(0.5), 4),
+            'p95_ms': round(percentile(0.95), 4),
+            'p99_ms': round(percentile(0.99), 4),
+            'max_ms': round(timings[-1] * 1000, 4)
+        }
+
+    def __get_cards(self, size):
+        while True:
+            yield self.CARD_FORMAT.format(random.randrange(size))
+
+    # endregion
+
+    # region Пользователи: DatabaseConnector и ServerHandler
+
+    def __connect(self, collection, cache_size=0):
+        from com.novikov.rfid import DatabaseConnector as module
+        if not self.client:
+            return module.DatabaseConnector(self.args.host, self.args.port, self.DATABASE, collection,
+                                            cache_size=cache_size)
+        # Все подключения коннектора должны видеть одно и то же хранилище mongomock.
+        # Подмена действует только на время создания коннектора
+        original = module.MongoClient
+        module.MongoClient = lambda *args, **kwargs: self.client
+        try:
+            # В mongomock нет потоков изменений, кэш загружается один раз без фонового отслеживания
+            return module.DatabaseConnector(self.args.host, self.args.port, self.DATABASE, collection,
+                                            cache_size=cache_size, cache_watch=False)
+        finally:
+            module.MongoClient = original
+
+    def __seed(self, collection, size):
+        client = self.client
+        if not client:
+            from pymongo import MongoClient
+            client = MongoClient(self.args.host, self.args.port)
+        target = client[self.DATABASE][collection]
+        target.drop()
+        start = perf_counter()
+        batch = []
+        for i in range(size):
+            user = UserModel(creator='benchmark',
+                             cards=[self.CARD_FORMAT.format(i)],
+                             name='Пользователь {}'.format(i),
+                             access=AccessLevel(i % len(AccessLevel)),
+                             expire=datetime(2100, 1, 1))
+            user.update_password(self.PASSWORD)
+            batch.append(user.get_model())
+            if len(batch) >= self.SEED_BATCH:
+                target.insert_many(batch)
+                batch = []
+        if batch:
+            target.insert_many(batch)
+        return perf_counter() - start
+
+    def __run_users(self, size):
+        self.logger.info("Набор из {} пользователей".format(size))
+        collection = 'users_{}'.format(size)
+        result = {'seed_s': round(self.__seed(collection, size), 3)}
+        start = perf_counter()
+        db = self.__connect(collection)
+        result['connect_s'] = round(perf_counter() - start, 3)
+        missing = ('X{:09d}'.format(x) for x in range(sys.maxsize))
+        if 'db' in self.args.sections:
+            result['get_user'] = self.__measure(db.get_user, self.__get_cards(size))
+            result['get_user_missing'] = self.__measure(db.get_user, missing)
+            # Кэш вмещает весь набор: замеряется путь без обращения к БД
+            cached = self.__connect(collection, cache_size=size)
+            result['get_user_cached'] = self.__measure(cached.get_user, self.__get_cards(size))
+            result['cache'] = cached.get_cache_stats()
+        if 'http' in self.args.sections:
+            result['http'] = self.__run_http(db, size)
+        db.drop_collection()
+        return result
+
+    def __start_server(self, db):
+        from com.novikov.server.PooledHTTPServer import PooledHTTPServer
+        from com.novikov.server.ServerHandler import ServerHandler
+        from com.novikov.server.SessionManager import SessionManager
+        # Без TLS: замеряется обработка запроса, рукопожатия учитываются отдельно в SecureContext
+        sessions = SessionManager()
+        handler = lambda *args: ServerHandler(False, 'localhost', db, None, sessions, None, *args)
+        server = PooledHTTPServer(('127.0.0.1', 0), handler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    @staticmethod
+    def __get_request(connection, url, headers=None):
+        connection.request('GET', url, headers=headers if headers else {})
+        response = connection.getresponse()
+        response.read()
+        return response
+
+    def __run_http(self, db, size):
+        server = self.__start_server(db)
+        connection = http.client.HTTPConnection(*server.server_address)
+        basic = lambda card: {'Authorization': 'Basic ' + b64encode(
+            '{}:{}'.format(card, self.PASSWORD).encode()).decode()}
+        try:
+            response = self.__get_request(connection, '/home', basic(self.CARD_FORMAT.format(0)))
+            cookie = response.getheader('Set-Cookie').split(';')[0]
+            result = {
+                # Разница между запросами с авторизацией и без нее - стоимость ServerHandler.get_user
+                'home_anonymous': self.__measure(lambda x: self.__get_request(connection, '/home'),
+                                                 self.__get_cards(size)),
+                'home_basic': self.__measure(lambda x: self.__get_request(connection, '/home', basic(x)),
+                                             self.__get_cards(size)),
+                'home_session': self.__measure(lambda x: self.__get_request(connection, '/home', {'Cookie': cookie}),
+                                               self.__get_cards(size)),
+                'validate': self.__measure(lambda x: self.__get_request(connection, '/request/validate?card=' + x),
+                                           self.__get_cards(size))
+            }
+            result['auth_basic_ms'] = round(result['home_basic']['mean_ms'] - result['home_anonymous']['mean_ms'], 4)
+            result['auth_session_ms'] = round(
+                result['home_session']['mean_ms'] - result['home_anonymous']['mean_ms'], 4)
+            return result
+        finally:
+            connection.close()
+            server.shutdown()
+            server.server_close()
+
+    # endregion
+
+    # region Лог посещений
+
+    def __write_visits(self, filename, lines):
+        from com.novikov.rfid.VisitsLogger import VisitsLogger
+        # Строки в формате VisitsLogger, по одному проходу в минуту до текущего момента
+        now = datetime.now().replace(second=0, microsecond=0)
+        first = now - timedelta(minutes=lines)
+        with open(filename, 'w') as file:
+            for i in range(lines):
+                file.write('{}: Вошел Пользователь {} ({}) \n'.format(
+                    (first + timedelta(minutes=i)).strftime(VisitsLogger.DATE_FORMAT),
+                    i,
+                    str(AccessLevel(i % len(AccessLevel)))))
+        return first, now
+
+    def __run_logs(self, lines):
+        from com.novikov.rfid.LogReader import LogReader
+        from com.novikov.rfid.VisitsLogger import VisitsLogger
+        from com.novikov.server.ServerHandler import ServerHandler
+        self.logger.info("Лог посещений из {} строк".format(lines))
+        start = perf_counter()
+        first, last = self.__write_visits(VisitsLogger.VISITS_LOG, lines)
+        result = {
+            'write_s': round(perf_counter() - start, 3),
+            'size_bytes': os.path.getsize(VisitsLogger.VISITS_LOG)
+        }
+        # Курсор глубокой страницы находится так же, как его получил бы пользователь, листая назад
+        reader = LogReader(VisitsLogger.VISITS_LOG, VisitsLogger.DATE_FORMAT)
+        cursor = None
+        for _ in range(min(self.DEEP_PAGES, lines // ServerHandler.LOGS_PAGE)):
+            cursor = reader.page(ServerHandler.LOGS_PAGE, before=cursor)['older'] or cursor
+        middle = (first + (last - first) / 2).strftime('%Y-%m-%d')
+        server = self.__start_server(None)
+        connection = http.client.HTTPConnection(*server.server_address)
+        try:
+            repeat = iter(int, 1)
+            result['first_page'] = self.__measure(lambda x: self.__get_request(connection, '/logs'), repeat)
+            result['deep_page'] = self.__measure(
+                lambda x: self.__get_request(connection, '/logs?before=' + cursor), repeat) if cursor else None
+            result['filtered_page'] = self.__measure(
+                lambda x: self.__get_request(connection, '/logs?since={0}&until={0}'.format(middle)), repeat)
+        finally:
+            connection.close()
+            server.shutdown()
+            server.server_close()
+        os.remove(VisitsLogger.VISITS_LOG)
+        return result
+
+    # endregion
+
+    # region Решения о допуске
+
+    def __run_policy(self):
+        from com.novikov.rfid.AccessPolicy import AccessPolicy
+        from com.novikov.rfid.DoorMode import DoorMode
+        policy = AccessPolicy(schedules={AccessLevel.guest: 'weekdays 09:00-18:00'})
+        now = datetime.now()
+        users = [UserModel(creator='benchmark',
+                           cards=[self.CARD_FORMAT.format(i)],
+                           name='Пользователь {}'.format(i),
+                           access=AccessLevel(i % len(AccessLevel)),
+                           expire=datetime(2100, 1, 1),
+                           active=i % 10 != 0) for i in range(self.args.batch)]
+        start = perf_counter()
+        for user in users:
+            policy.decide(user, now, DoorMode.STANDARD)
+        decide = perf_counter() - start
+        taps = [policy.get_tap(x, now) for x in users]
+        start = perf_counter()
+        policy.decide_batch(taps, DoorMode.STANDARD)
+        batch = perf_counter() - start
+        return {
+            'decisions': len(users),
+            'decide_per_s': round(len(users) / decide),
+            'decide_batch_per_s': round(len(users) / batch)
+        }
+
+    # endregion
+
+    # region UART через псевдотерминал
+
+    def __run_serial(self):
+        from com.novikov.rfid.SerialConnector import SerialConnector
+        master, slave = os.openpty()
+        received = [0]
+        expected = self.args.commands * 2
+
+        def drain():
+            while received[0] < expected:
+                try:
+                    received[0] += len(os.read(master, 4096))
+                except OSError:
+                    return
+
+        reader = Thread(target=drain, daemon=True)
+        reader.start()
+        connector = SerialConnector(os.ttyname(slave), 115200)
+        try:
+            start = perf_counter()
+            # Каждое открытие - две команды (замок и индикатор), соседние команды не совпадают
+            for _ in range(self.args.commands):
+                connector.open()
+            while received[0] + connector.expired < expected and perf_counter() - start < self.args.budget * 4:
+                sleep(0.001)
+            elapsed = perf_counter() - start
+            stats = connector.get_stats()
+        finally:
+            connector.close()
+            os.close(slave)
+            os.close(master)
+        return {
+            'commands': expected,
+            'written': received[0],
+            'elapsed_s': round(elapsed, 4),
+            'per_s': round(received[0] / elapsed) if elapsed else 0,
+            'expired': stats['expired'],
+            'coalesced': stats['coalesced'],
+            'codes': {str(code): {key: round(value, 4) for key, value in x.items()}
+                      for code, x in stats['commands'].items()}
+        }
+
+    # endregion
+
+
+def get_arguments():
+    numbers = lambda x: [int(y) for y in re.split(r'[,\s]+', x) if y]
+    parser = ArgumentParser(description="Замеры производительности RFID")
+    parser.add_argument('--host', default='localhost', help="адрес MongoDB")
+    parser.add_argument('--port', type=int, default=27017, help="порт MongoDB")
+    parser.add_argument('--mongomock', action='store_true', help="использовать mongomock вместо MongoDB")
+    parser.add_argument('--sizes', type=numbers, default=[1000, 100000, 1000000], help="размеры наборов пользователей")
+    parser.add_argument('--log-lines', type=numbers, default=[10000, 1000000], help="размеры лога посещений")
+    parser.add_argument('--iterations', type=int, default=1000, help="повторов в каждом случае")
+    parser.add_argument('--budget', type=float, default=5, help="предел времени на случай, с")
+    parser.add_argument('--batch', type=int, default=100000, help="решений о допуске в пакете")
+    parser.add_argument('--commands', type=int, default=5000, help="открытий двери через UART")
+    parser.add_argument('--sections', nargs='+', choices=Benchmark.SECTIONS, default=Benchmark.SECTIONS,
+                        help="выполняемые замеры")
+    parser.add_argument('--output', help="файл для результатов, по умолчанию stdout")
+    args = parser.parse_args()
+    if args.mongomock and find_spec('mongomock') is None:
+        parser.error("для --mongomock необходим пакет mongomock")
+    # Замеры выполняются во временном каталоге: относительный путь считается от текущего
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    return args
+
+
+if __name__ == '__main__':
+    arguments = get_arguments()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s: %(message)s', stream=sys.stderr)
+    # Отладочные сообщения поиска карт не пишутся, как и в рабочей конфигурации rfid.db
+    logging.getLogger('rfid.db').setLevel(logging.WARNING)
+    logging.getLogger('rfid.access').setLevel(logging.WARNING)
+    results = Benchmark(arguments).run()
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            json.dump(results, output, ensure_ascii=False, indent=2)
+    else:
+        json.dump(results, sys.stdout, ensure_ascii=False, indent=2)
+        print()
@@ -3,7 +3,9 @@
 import logging
 import logging.handlers
 import os
+from queue import Queue
 import subprocess
+from tempfile import NamedTemporaryFile
 from time import sleep
 from datetime import datetime, date, timedelta
 import signal
@@ -13,8 +15,17 @@ import sys
 from dialog import Dialog
 from pymongo.errors import PyMongoError
 
+from com.novikov.rfid.AccessPolicy import AccessPolicy
 from com.novikov.rfid.CardReader import CardReader
 from com.novikov.rfid.DatabaseConnector import DatabaseConnector
+from com.novikov.rfid.DoorController import DoorController
+from com.novikov.rfid.DoorMode import DoorMode
+from com.novikov.rfid.EventStore import EventStore
+from com.novikov.rfid.LogFileHandler import LogFileHandler
+from com.novikov.rfid.LogReader import LogReader
+from com.novikov.rfid.LogRotator import LogRotator
+from com.novikov.rfid.LogWriter import LogWriter
+from com.novikov.rfid.Schedule import Schedule
 from com.novikov.rfid.SerialConnector import SerialConnector
 from com.novikov.rfid.Settings import Settings
 from com.novikov.rfid.UserModel import UserModel
@@ -22,6 +33,7 @@ from com.novikov.rfid.AccessLevel import AccessLevel
 from com.novikov.rfid.VisitsLogger import VisitsLogger
 from com.novikov.rfid import __version__
 from com.novikov.server.Server import Server
+from com.novikov.server.ServerHandler import ServerHandler
 
 
 __author__ = 'Ilia Novikov'
@@ -31,21 +43,23 @@ DEBUG = 'debug' in sys.argv
 
 class Main:
     APPLICATION_LOG = 'logs/application.log'
+    LOG_VIEW_LINES = 1000
 
     def __init__(self):
         if not os.path.exists('logs'):
             os.makedirs('logs')
         if not os.path.exists('keys'):
             os.makedirs('keys')
-        logging.basicConfig(format='%(filename)s[LINE:%(lineno)d]# %(levelname)-8s [%(asctime)s]  %(message)s',
-                            level=logging.DEBUG,
-                            filename=self.APPLICATION_LOG)
+        self.settings = Settings()
+        self.rotator = LogRotator(self.settings.get_rotation_option(Settings.ROTATION_SIZE),
+                                  self.settings.get_rotation_option(Settings.ROTATION_AGE),
+                                  self.settings.get_rotation_option(Settings.ROTATION_RETENTION))
+        with open(self.APPLICATION_LOG, mode='a') as log:
+            log.write('-------------------------------------------------- \n')
+        self.log_listener = self.setup_logging()
         self.logger = logging.getLogger()
         self.dialog = Dialog(dialog='dialog')
-        self.visits_logger = VisitsLogger()
         self.debug = DEBUG
-        with open(self.APPLICATION_LOG, mode='a') as log:
-            log.write('-------------------------------------------------- \n')
         self.logger.info("Приложение запущено, версия {}".format(__version__))
         if getuid() != 0:
             self.logger.error("Попытка запуска без прав root")
@@ -56,7 +70,24 @@ class Main:
             self.exit()
         if self.debug:
             self.logger.info("Запуск в отладочном режиме")
-        self.settings = Settings()
+        self.log_writer = LogWriter(self.settings.get_writer_durability(),
+                                    self.settings.get_writer_option(Settings.WRITER_INTERVAL),
+                                    self.settings.get_writer_option(Settings.WRITER_QUEUE))
+        for filename in [VisitsLogger.VISITS_LOG, VisitsLogger.ILLEGAL_LOG]:
+            self.log_writer.set_rotator(filename, self.rotator)
+        try:
+            self.policy = AccessPolicy(schedules=self.settings.get_schedules(),
+                                       holidays=self.settings.get_holidays())
+            # Лог посещений или ночной лог выбирается по тем же расписаниям, что и доступ
+            legal = self.settings.get_legal_schedule()
+            self.visits_logger = VisitsLogger(self.log_writer, self.policy, Schedule(legal) if legal else None)
+        except ValueError as e:
+            self.logger.error("Ошибка в настройках расписания: {}".format(e))
+            self.dialog.msgbox("Ошибка в настройках расписания \n" +
+                               "Работа завершена",
+                               width=0,
+                               height=0)
+            self.exit()
         if self.settings.is_first_run:
             if not self.create_settings():
                 self.logger.error("Ошибка при создании настроек приложения!")
@@ -89,7 +120,12 @@ class Main:
                                         int(self.settings.get_db_option(Settings.DB_PORT)),
                                         self.settings.get_db_option(Settings.DB_NAME),
                                         self.settings.get_db_option(Settings.DB_COLLECTION),
-                                        credentials)
+                                        credentials,
+                                        cache_size=self.settings.get_cache_option(Settings.CACHE_SIZE),
+                                        cache_refresh=self.settings.get_cache_option(Settings.CACHE_REFRESH),
+                                        snapshot_path=self.settings.get_snapshot_path(),
+                                        snapshot_refresh=self.settings.get_cache_option(Settings.SNAPSHOT_REFRESH),
+                                        lookup_timeout=self.settings.get_cache_option(Settings.LOOKUP_TIMEOUT))
         except PyMongoError as e:
             self.logger.error("Ошибка входа с текущими настройками подключения к БД: {}".format(e))
             self.dialog.msgbox("Ошибка входа с текущими настройками подключения к БД \n" +
@@ -97,9 +133,13 @@ class Main:
                                width=0,
                                height=0)
             self.exit()
+        if self.settings.get_events_path():
+            self.visits_logger.attach_store(EventStore(self.settings.get_events_path(), self.log_writer))
         self.is_waiting_card = False
+        self.last_card = None
+        self.last_reader = None
         if not self.debug:
-            self.card_reader = CardReader(self)
+            self.card_reader = CardReader(self, self.settings.get_readers())
             self.card_reader.start()
         if not self.db.has_users():
             self.logger.info("Пользователи не найдены, будет создан аккаунт разработчика")
@@ -147,8 +187,14 @@ class Main:
         self.operator = None
         """ :type : UserModel """
         self.serial = SerialConnector(self.settings.get_uart_path(), 9600)
+        self.door = DoorController(self.serial)
         if 'server' in sys.argv:
-            self.server = Server(DEBUG, False, self.db, self.serial)
+            self.server = Server(DEBUG, False, self.db, self.door,
+                                 workers=self.settings.get_server_option(Settings.SERVER_WORKERS),
+                                 queue_size=self.settings.get_server_option(Settings.SERVER_QUEUE),
+                                 timeout=self.settings.get_server_option(Settings.SERVER_TIMEOUT),
+                                 keep_alive=self.settings.get_server_option(Settings.SERVER_KEEP_ALIVE),
+                                 asynchronous=self.settings.get_server_mode() == Settings.SERVER_MODE_ASYNCIO)
             self.server.start()
         self.was_unlocked = False
         if self.settings.get_lock_state():
@@ -619,39 +665,44 @@ class Main:
 
     # region Режимы работы
 
+    def deny_access(self, card_id, decision: AccessPolicy.Decision):
+        self.serial.error()
+        if decision.reason == AccessPolicy.UNKNOWN_CARD:
+            self.visits_logger.wrong_id(card_id, self.last_reader)
+            message = "Карта отклонена!"
+        elif decision.reason == AccessPolicy.INACTIVE:
+            self.visits_logger.inactive_card(self.operator, card_id, self.last_reader)
+            message = "Карта заблокирована!"
+        elif decision.reason == AccessPolicy.EXPIRED:
+            self.visits_logger.expired(self.operator, card_id, self.last_reader)
+            message = "Карта устарела!"
+        elif decision.reason == AccessPolicy.OFF_SCHEDULE:
+            self.visits_logger.off_schedule(self.operator, card_id, self.last_reader)
+            message = "Доступ вне расписания!"
+        elif decision.reason == AccessPolicy.DOOR_CLOSED:
+            self.visits_logger.door_closed(self.operator, card_id, self.last_reader)
+            message = "Проход в этом режиме закрыт!"
+        else:
+            self.visits_logger.wrong_access(self.operator, card_id, self.last_reader)
+            message = "Низкий уровень доступа!"
+        self.dialog.infobox(message + " \n" +
+                            "Запись добавлена в лог",
+                            width=0,
+                            height=0)
+        sleep(self.settings.get_delay_option(Settings.DELAY_ERROR))
+
     def standard_mode(self):
         while True:
-            self.serial.standard()
+            self.door.set_mode(DoorMode.STANDARD)
             self.dialog.set_background_title("Рабочий режим")
             card_id = self.request_card("Приложите карту...")
             self.operator = self.db.get_user(card_id)
-            if not self.operator:
-                self.serial.error()
-                self.visits_logger.wrong_id(card_id)
-                self.dialog.infobox("Карта отклонена! \n" +
-                                    "Запись добавлена в лог",
-                                    width=0,
-                                    height=0)
-                sleep(self.settings.get_delay_option(Settings.DELAY_ERROR))
-            elif not self.operator.active:
-                self.serial.error()
-                self.visits_logger.inactive_card(self.operator)
-                self.dialog.infobox("Карта заблокирована! \n" +
-                                    "Запись добавлена в лог",
-                                    width=0,
-                                    height=0)
-                sleep(self.settings.get_delay_option(Settings.DELAY_ERROR))
-            elif datetime.now() >= self.operator.expire:
-                self.serial.error()
-                self.visits_logger.inactive_card(self.operator)
-                self.dialog.infobox("Карта устарела! \n" +
-                                    "Запись добавлена в лог",
-                                    width=0,
-                                    height=0)
-                sleep(self.settings.get_delay_option(Settings.DELAY_ERROR))
+            decision = self.policy.decide(self.operator, datetime.now(), DoorMode.STANDARD)
+            if not decision.allowed:
+                self.deny_access(card_id, decision)
             else:
-                self.serial.open()
-                self.visits_logger.visit(self.operator)
+                self.door.unlock(self.settings.get_delay_option(Settings.DELAY_SUCCESS))
+                self.visits_logger.visit(self.operator, card_id, self.last_reader)
                 code = self.dialog.pause("Авторизация успешна \n" +
                                          "Пользователь: {} \n".format(self.operator.name) +
                                          "Уровень доступа: {} \n".format(str(self.operator.access)),
@@ -660,7 +711,7 @@ class Main:
                                          extra_button=True,
                                          extra_label="Консоль")
                 if code == Dialog.EXTRA:
-                    self.serial.maintenance()
+                    self.door.set_mode(DoorMode.MAINTENANCE)
                     self.show_control_window()
 
     def lock_mode(self):
@@ -668,43 +719,14 @@ class Main:
         self.settings.save()
         self.dialog.set_background_title("Установлена блокировка")
         while True:
-            self.serial.lock()
+            self.door.set_mode(DoorMode.LOCK)
             card_id = self.request_card("Приложите карту повышенного доступа")
             self.operator = self.db.get_user(card_id)
-            if not self.operator:
-                self.serial.error()
-                self.dialog.infobox("Карта отклонена! \n" +
-                                    "Запись добавлена в лог",
-                                    width=0,
-                                    height=0)
-                self.visits_logger.wrong_id(card_id)
-                sleep(self.settings.get_delay_option(Settings.DELAY_ERROR))
-            elif not self.operator.active:
-                self.serial.error()
-                self.visits_logger.inactive_card(self.operator)
-                self.dialog.infobox("Карта заблокирована! \n" +
-                                    "Запись добавлена в лог",
-                                    width=0,
-                                    height=0)
-                sleep(self.settings.get_delay_option(Settings.DELAY_ERROR))
-            elif datetime.now() >= self.operator.expire:
-                self.serial.error()
-                self.visits_logger.inactive_card(self.operator)
-                self.dialog.infobox("Карта устарела! \n" +
-                                    "Запись добавлена в лог",
-                                    width=0,
-                                    height=0)
-                sleep(self.settings.get_delay_option(Settings.DELAY_ERROR))
-            elif self.operator.access.value <= AccessLevel.common.value:
-                self.serial.error()
-                self.dialog.infobox("Низкий уровень доступа! \n" +
-                                    "Запись добавлена в лог",
-                                    width=0,
-                                    height=0)
-                self.visits_logger.wrong_access(self.operator)
-                sleep(self.settings.get_delay_option(Settings.DELAY_ERROR))
+            decision = self.policy.decide(self.operator, datetime.now(), DoorMode.LOCK)
+            if not decision.allowed:
+                self.deny_access(card_id, decision)
             else:
-                self.serial.open()
+                self.door.unlock(self.settings.get_delay_option(Settings.DELAY_SUCCESS))
                 code = self.dialog.pause("Блокировка снята \n" +
                                          "Пользователь: {} \n".format(self.operator.name) +
                                          "Уровень доступа: {} \n".format(str(self.operator.access)),
@@ -714,9 +736,9 @@ class Main:
                                          extra_label="Консоль")
                 self.settings.set_lock_state(False)
                 self.settings.save()
-                self.visits_logger.visit(self.operator)
+                self.visits_logger.visit(self.operator, card_id, self.last_reader)
                 if code == Dialog.EXTRA:
-                    self.serial.maintenance()
+                    self.door.set_mode(DoorMode.MAINTENANCE)
                     self.show_control_window()
                 return
 
@@ -764,7 +786,7 @@ class Main:
                                         "Запись добавлена в лог",
                                         width=0,
                                         height=0)
-                    self.visits_logger.wrong_password(self.operator)
+                    self.visits_logger.wrong_password(self.operator, self.last_card, self.last_reader)
                     sleep(self.settings.get_delay_option(Settings.DELAY_ERROR))
                     return
         choices = [
@@ -823,20 +845,14 @@ class Main:
             self.operator.name,
             str(self.operator.access)
         ))
-        if path.exists(self.APPLICATION_LOG):
-            self.dialog.textbox(self.APPLICATION_LOG,
-                                width=0,
-                                height=0)
+        self.show_log(self.APPLICATION_LOG)
 
     def show_visits_log(self):
         self.logger.info("Пользователь {} с правами доступа '{}' просматривает лог посещений".format(
             self.operator.name,
             str(self.operator.access)
         ))
-        if path.exists(VisitsLogger.VISITS_LOG):
-            self.dialog.textbox(VisitsLogger.VISITS_LOG,
-                                width=0,
-                                height=0)
+        self.show_log(VisitsLogger.VISITS_LOG)
 
     def clean_db(self):
         self.logger.info("Попытка очистки БД пользователем {}".format(self.operator))
@@ -862,15 +878,14 @@ class Main:
                                 "Запись добавлена в лог",
                                 width=0,
                                 height=0)
-            self.visits_logger.wrong_password(self.operator)
+            self.visits_logger.wrong_password(self.operator, self.last_card, self.last_reader)
             sleep(self.settings.get_delay_option(Settings.DELAY_ERROR))
             return
         self.db.drop_collection()
         self.db.drop_db_user(self.settings.get_db_option(Settings.DB_USER))
-        if path.exists(self.APPLICATION_LOG):
-            remove(self.APPLICATION_LOG)
-        if path.exists(VisitsLogger.VISITS_LOG):
-            remove(VisitsLogger.VISITS_LOG)
+        LogRotator.remove(self.APPLICATION_LOG)
+        self.log_writer.release(VisitsLogger.VISITS_LOG)
+        LogRotator.remove(VisitsLogger.VISITS_LOG)
         if path.exists(Settings.FILENAME):
             remove(Settings.FILENAME)
         self.exit()
@@ -882,43 +897,84 @@ class Main:
                                  height=0)
         if code != Dialog.OK:
             return
-        remove(self.APPLICATION_LOG)
+        LogRotator.remove(self.APPLICATION_LOG)
         self.exit()
 
     def clean_visits_log(self):
-        if not path.exists(VisitsLogger.VISITS_LOG):
+        if not LogReader(VisitsLogger.VISITS_LOG).exists():
             return
         code = self.dialog.yesno("Вы уверены?",
                                  width=0,
                                  height=0)
         if code != Dialog.OK:
             return
-        remove(VisitsLogger.VISITS_LOG)
+        self.log_writer.release(VisitsLogger.VISITS_LOG)
+        LogRotator.remove(VisitsLogger.VISITS_LOG)
         if self.operator.access.value < AccessLevel.developer.value:
             self.logger.info("Пользователь {} очистил лог посещений".format(self.operator.name))
 
     def clean_illegal_log(self):
-        if not path.exists(VisitsLogger.ILLEGAL_LOG):
+        if not LogReader(VisitsLogger.ILLEGAL_LOG).exists():
             return
         code = self.dialog.yesno("Вы уверены?",
                                  width=0,
                                  height=0)
         if code != Dialog.OK:
             return
-        remove(VisitsLogger.ILLEGAL_LOG)
+        self.log_writer.release(VisitsLogger.ILLEGAL_LOG)
+        LogRotator.remove(VisitsLogger.ILLEGAL_LOG)
 
     def show_illegal_log(self):
-        if path.exists(VisitsLogger.ILLEGAL_LOG):
-            self.dialog.textbox(VisitsLogger.ILLEGAL_LOG,
+        self.show_log(VisitsLogger.ILLEGAL_LOG)
+
+    def show_log(self, filename):
+        # Последние записи текущего файла и сжатых сегментов собираются во временный файл для просмотра
+        self.log_writer.flush()
+        reader = LogReader(filename)
+        if not reader.exists():
+            return
+        with NamedTemporaryFile(mode='w', suffix='.log') as log:
+            log.write('\n'.join(reader.page(self.LOG_VIEW_LINES)['items']) + '\n')
+            log.flush()
+            self.dialog.textbox(log.name,
                                 width=0,
                                 height=0)
 
     def exit(self):
         if self.server:
             self.server.stop()
+        if hasattr(self, 'door'):
+            self.door.close()
+        if hasattr(self, 'serial'):
+            self.serial.close()
+        if hasattr(self, 'log_writer'):
+            self.log_writer.close()
         self.logger.info("Выполнение программы завершено")
+        self.log_listener.stop()
         exit(1)
 
+    def __create_log_handler(self, filename, pattern):
+        handler = LogFileHandler(filename, self.rotator)
+        handler.setFormatter(logging.Formatter(pattern))
+        return handler
+
+    def setup_logging(self):
+        # Потоки приложения только кладут записи в очередь, в файлы пишет фоновый QueueListener
+        application = self.__create_log_handler(
+            self.APPLICATION_LOG,
+            '%(filename)s[LINE:%(lineno)d]# %(levelname)-8s [%(asctime)s] %(name)s (%(threadName)s)  %(message)s')
+        application.addFilter(lambda record: record.name != ServerHandler.ACCESS_LOGGER)
+        access = self.__create_log_handler(ServerHandler.REQUESTS_LOG, '%(message)s')
+        access.addFilter(logging.Filter(ServerHandler.ACCESS_LOGGER))
+        records = Queue()
+        root = logging.getLogger()
+        root.addHandler(logging.handlers.QueueHandler(records))
+        for name, level in self.settings.get_log_levels().items():
+            logging.getLogger(None if name == 'root' else name).setLevel(level)
+        listener = logging.handlers.QueueListener(records, application, access, respect_handler_level=True)
+        listener.start()
+        return listener
+
     @staticmethod
     def run_bash():
         subprocess.call('bash')
@@ -932,24 +988,23 @@ class Main:
                 code, result = self.dialog.inputbox("Приложите карту (ОТЛАДКА)",
                                                     width=0,
                                                     height=0)
+            self.last_card, self.last_reader = result, None
             return result
+        self.card_reader.clear()
         self.is_waiting_card = True
         self.dialog.infobox(title,
                             width=0,
                             height=0)
-        timer = 0
-        while not self.card_reader.card_id:
-            timer += 1
-            if timer >= 5 * 10:
-                timer = 0
-                self.dialog.infobox(title,
-                                    width=0,
-                                    height=0)
-            sleep(100.0 / 1000.0)
+        event = self.card_reader.wait_card(5)
+        while not event:
+            self.dialog.infobox(title,
+                                width=0,
+                                height=0)
+            event = self.card_reader.wait_card(5)
         self.is_waiting_card = False
-        card_id = self.card_reader.card_id
-        self.card_reader.card_id = ''
-        return card_id
+        self.logger.debug("Получена карта {}".format(event))
+        self.last_card, self.last_reader = event.card_id, event.reader
+        return event.card_id
 
 
 signals = None
@@ -0,0 +1,119 @@
+from collections import namedtuple
+from datetime import datetime
+import logging
+
+from com.novikov.rfid.AccessLevel import AccessLevel
+from com.novikov.rfid.DoorMode import DoorMode
+from com.novikov.rfid.Schedule import Schedule
+from com.novikov.rfid.UserModel import UserModel
+
+
+__author__ = 'Ilia Novikov'
+
+
+class AccessPolicy:
+    # Решение о допуске без ввода-вывода: по пользователю, времени и режиму двери
+    Decision = namedtuple('Decision', ['allowed', 'reason'])
+
+    GRANTED = 'granted'
+    UNKNOWN_CARD = 'unknown_card'
+    INACTIVE = 'inactive'
+    EXPIRED = 'expired'
+    LOW_ACCESS = 'low_access'
+    OFF_SCHEDULE = 'off_schedule'
+    DOOR_CLOSED = 'door_closed'
+
+    # Режимы без записи (DoorMode.MAINTENANCE) закрыты для всех карт: решение DOOR_CLOSED
+    MINIMUM_ACCESS = {
+        DoorMode.STANDARD: AccessLevel.guest,
+        DoorMode.LOCK: AccessLevel.privileged
+    }
+
+    def __init__(self, minimum_access=None, schedules=None, holidays=None):
+        self.logger = logging.getLogger('rfid.door')
+        self.minimum_access = minimum_access if minimum_access else self.MINIMUM_ACCESS
+        # Расписания уровней доступа: {AccessLevel: спецификация}, без расписания доступ круглосуточный
+        self.holidays = set(holidays) if holidays else set()
+        # Решения - общие неизменяемые экземпляры, проверка уровня доступа - индекс в таблице режима
+        self.__decisions = {x: self.Decision(x == self.GRANTED, x) for x in
+                            [self.GRANTED, self.UNKNOWN_CARD, self.INACTIVE, self.EXPIRED, self.LOW_ACCESS,
+                             self.OFF_SCHEDULE, self.DOOR_CLOSED]}
+        self.__tables = {mode: self.__compile(minimum) for mode, minimum in self.minimum_access.items()}
+        self.__compiled = {}
+        self.__closed = self.__compile(None)
+        self.__schedules = [None] * len(self.__closed)
+        # Ошибка в расписании уровня доступа останавливает запуск (ValueError)
+        for level, spec in (schedules or {}).items():
+            self.__schedules[level.value] = Schedule(spec)
+        self.__schedules = tuple(self.__schedules)
+
+    def get_schedule(self, spec):
+        # Личные расписания пользователей компилируются один раз на спецификацию
+        schedule = self.__compiled.get(spec)
+        if schedule is None:
+            try:
+                schedule = Schedule(spec)
+            except ValueError as e:
+                # Ошибочное расписание из БД не должно останавливать цикл двери: доступ по нему закрыт
+                self.logger.error("Неверное личное расписание, доступ по нему закрыт: {}".format(e))
+                schedule = Schedule(Schedule.NEVER)
+            self.__compiled[spec] = schedule
+        return schedule
+
+    def get_user_schedule(self, user: UserModel):
+        # Личное расписание пользователя заменяет расписание его уровня доступа; None - без ограничений
+        return self.get_schedule(user.schedule) if user.schedule else self.__schedules[user.access.value]
+
+    def __compile(self, minimum: AccessLevel):
+        if minimum is None:
+            return tuple([self.__decisions[self.DOOR_CLOSED]] * (max(x.value for x in AccessLevel) + 1))
+        table = [self.__decisions[self.LOW_ACCESS]] * (max(x.value for x in AccessLevel) + 1)
+        for level in AccessLevel:
+            if level.value >= minimum.value:
+                table[level.value] = self.__decisions[self.GRANTED]
+        return tuple(table)
+
+    def decide(self, user: UserModel, now: datetime, mode):
+        if user is None:
+            return self.__decisions[self.UNKNOWN_CARD]
+        if not user.active:
+            return self.__decisions[self.INACTIVE]
+        if now >= user.expire:
+            return self.__decisions[self.EXPIRED]
+        decision = self.__tables.get(mode, self.__closed)[user.access.value]
+        if not decision.allowed:
+            return decision
+        schedule = self.get_user_schedule(user)
+        if schedule and not schedule.allows(Schedule.get_index(now, self.holidays)):
+            return self.__decisions[self.OFF_SCHEDULE]
+        return decision
+
+    def get_tap(self, user: UserModel, now: datetime):
+        # Компактное представление прикладывания карты для пакетной проверки:
+        # (уровень доступа, активна, окончание, время, минута недели, личное расписание)
+        if user is None:
+            return None
+        return (user.access.value, user.active, user.expire.timestamp(), now.timestamp(),
+                Schedule.get_index(now, self.holidays), self.get_schedule(user.schedule) if user.schedule else None)
+
+    def decide_batch(self, taps, mode):
+        table = self.__tables.get(mode, self.__closed)
+        schedules = self.__schedules
+        unknown = self.__decisions[self.UNKNOWN_CARD]
+        inactive = self.__decisions[self.INACTIVE]
+        expired = self.__decisions[self.EXPIRED]
+        off_schedule = self.__decisions[self.OFF_SCHEDULE]
+        result = []
+        append = result.append
+        for tap in taps:
+            if tap is None:
+                append(unknown)
+            elif not tap[1]:
+                append(inactive)
+            elif tap[3] >= tap[2]:
+                append(expired)
+            else:
+                decision = table[tap[0]]
+                schedule = tap[5] or schedules[tap[0]]
+                append(off_schedule if decision.allowed and schedule and not schedule.allows(tap[4]) else decision)
+        return result
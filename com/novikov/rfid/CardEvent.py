@@ -0,0 +1,16 @@
+from datetime import datetime
+
+
+__author__ = 'Ilia Novikov'
+
+
+class CardEvent:
+    __slots__ = ('card_id', 'timestamp', 'reader')
+
+    def __init__(self, card_id, timestamp, reader=None):
+        self.card_id = card_id
+        self.timestamp = timestamp
+        self.reader = reader
+
+    def __str__(self):
+        return '{} ({}, {})'.format(self.card_id, self.reader, datetime.fromtimestamp(self.timestamp))
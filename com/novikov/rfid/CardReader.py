@@ -1,10 +1,16 @@
+import logging
 import os
-from threading import Thread
-from time import sleep
+import selectors
+from queue import Queue, Empty, Full
+from threading import Thread, Lock
+from time import sleep, time
 
 from evdev import InputDevice, KeyEvent
 from evdev import ecodes
 
+from com.novikov.rfid.CardEvent import CardEvent
+from com.novikov.rfid.DeviceWatcher import DeviceWatcher
+
 
 __author__ = 'ilia'
 
@@ -24,40 +30,196 @@ class CardReader(Thread):
         28: 'enter'
     }
 
-    def __init__(self, parent):
+    DEFAULT_READER = 'default'
+    DEFAULT_DEVICE = \
+        '/dev/input/' \
+        'by-id/' \
+        'usb-Sycreader_RFID_Technology_Co.__Ltd_SYC_ID_IC_USB_Reader_08FF20140315-event-kbd'
+    QUEUE_SIZE = 16
+
+    def __init__(self, parent, readers=None, queue_size=QUEUE_SIZE):
         Thread.__init__(self)
         self.daemon = True
         self.parent = parent
-        self.card_id = ''
+        self.readers = dict(readers) if readers else {self.DEFAULT_READER: self.DEFAULT_DEVICE}
+        """ :type : dict[str, str] """
+        self.__selector = selectors.DefaultSelector()
+        self.__devices = {}
+        # Буфер нажатий у каждого считывателя свой, чтобы не смешивать цифры разных карт
+        self.__buffers = {}
+        self.__events = Queue(maxsize=queue_size)
+        self.__lock = Lock()
+        self.__watcher = None
+        self.__status = {x: {'connected': False,
+                             'attaches': 0,
+                             'reconnects': 0,
+                             'last_error': None,
+                             'last_error_time': None} for x in self.readers}
+        self.__loop_status = {'last_error': None, 'last_error_time': None}
+        self.logger = logging.getLogger('rfid.reader')
+        self.dropped = 0
+
+    def __deliver(self, event: CardEvent):
+        with self.__lock:
+            try:
+                self.__events.put_nowait(event)
+            except Full:
+                # Вытесняется самое старое событие: актуально последнее прикладывание карты.
+                # Очередь могла опустеть из-за потребителя, забравшего событие раньше
+                try:
+                    self.__events.get_nowait()
+                except Empty:
+                    pass
+                self.__events.put_nowait(event)
+                self.dropped += 1
+
+    def wait_card(self, timeout=None):
+        try:
+            return self.__events.get(timeout=timeout)
+        except Empty:
+            return None
+
+    def clear(self):
+        with self.__lock:
+            count = 0
+            while True:
+                try:
+                    self.__events.get_nowait()
+                except Empty:
+                    return count
+                count += 1
+
+    def get_queue_depth(self):
+        return self.__events.qsize()
+
+    def get_status(self):
+        with self.__lock:
+            return {name: dict(status) for name, status in self.__status.items()}
+
+    def __set_error(self, name, error):
+        with self.__lock:
+            status = self.__status[name] if name else self.__loop_status
+            # Повторяющаяся ошибка открытия устройства пишется в лог один раз
+            if status['last_error'] != str(error):
+                self.logger.error("Ошибка считывателя {}: {}".format(name if name else '', error))
+            status['last_error'] = str(error)
+            status['last_error_time'] = time()
+
+    def get_last_error(self):
+        with self.__lock:
+            return dict(self.__loop_status)
 
     def run(self):
+        try:
+            self.__watcher = DeviceWatcher()
+            self.__selector.register(self.__watcher, selectors.EVENT_READ, None)
+        except OSError as e:
+            self.logger.warning("inotify недоступен, считыватели будут проверяться раз в секунду: {}".format(e))
+            self.__watcher = None
+        self.__watch_directories()
+        self.__attach_missing()
         while True:
             try:
-                path = \
-                    '/dev/input/' \
-                    'by-id/' \
-                    'usb-Sycreader_RFID_Technology_Co.__Ltd_SYC_ID_IC_USB_Reader_08FF20140315-event-kbd'
-                if not os.path.exists(path):
-                    sleep(1)
-                    continue
+                # Без inotify и при ошибках открытия устройства считыватели проверяются раз в секунду
+                is_pending = any(x not in self.__devices and os.path.exists(y) for x, y in self.readers.items())
+                timeout = 1 if not self.__watcher or is_pending else None
+                for key, _ in self.__selector.select(timeout=timeout):
+                    if key.data is None:
+                        self.__handle_changes()
+                    else:
+                        self.__read(key.data)
+                if timeout:
+                    self.__attach_missing()
+            except Exception as e:
+                self.__set_error(None, e)
+                sleep(1)
+
+    def __watch_directories(self):
+        if not self.__watcher:
+            return
+        for path in self.readers.values():
+            # Каталог by-id создается udev только при подключении первого устройства,
+            # поэтому до его появления отслеживается ближайший существующий родитель
+            directory = os.path.dirname(path)
+            while directory != os.path.dirname(directory) and not os.path.isdir(directory):
+                directory = os.path.dirname(directory)
+            self.__watcher.watch(directory)
+
+    def __handle_changes(self):
+        changes = self.__watcher.read()
+        if any(mask & (DeviceWatcher.IN_CREATE | DeviceWatcher.IN_DELETE_SELF) for _, _, mask in changes):
+            self.__watch_directories()
+        for directory, filename, mask in changes:
+            if not mask & (DeviceWatcher.IN_DELETE | DeviceWatcher.IN_MOVED_FROM):
+                continue
+            changed = os.path.join(directory, filename)
+            for name, path in self.readers.items():
+                if path == changed and name in self.__devices:
+                    self.logger.info("Считыватель {} отключен".format(name))
+                    self.__detach(name)
+        self.__attach_missing()
+
+    def __attach_missing(self):
+        for name, path in self.readers.items():
+            if name in self.__devices or not os.path.exists(path):
+                continue
+            try:
                 device = InputDevice(path)
                 device.grab()
-                buffer = []
-                for event in device.read_loop():
-                    if event.type != ecodes.EV_KEY:
-                        continue
-                    press = KeyEvent(event)
-                    if press.keystate != KeyEvent.key_down:
-                        continue
-                    char = self.__scan_codes[press.scancode]
-                    if char == 'enter':
-                        if not self.parent.is_waiting_card:
-                            buffer.clear()
-                            continue
-                        self.card_id = ''.join(buffer)
-                        buffer.clear()
-                        continue
-                    buffer.append(str(char))
-            except:
-                sleep(1)
-                pass
\ No newline at end of file
+            except OSError as e:
+                self.__set_error(name, e)
+                continue
+            self.__devices[name] = device
+            self.__buffers[name] = []
+            self.__selector.register(device, selectors.EVENT_READ, name)
+            with self.__lock:
+                status = self.__status[name]
+                if status['attaches']:
+                    status['reconnects'] += 1
+                status['attaches'] += 1
+                status['connected'] = True
+            self.logger.info("Считыватель {} подключен: {}".format(name, path))
+
+    def __detach(self, name):
+        device = self.__devices.pop(name, None)
+        self.__buffers.pop(name, None)
+        with self.__lock:
+            self.__status[name]['connected'] = False
+        if device is None:
+            return
+        try:
+            self.__selector.unregister(device)
+        except (KeyError, ValueError):
+            pass
+        try:
+            device.close()
+        except OSError:
+            pass
+
+    def __read(self, name):
+        device = self.__devices[name]
+        buffer = self.__buffers[name]
+        try:
+            for event in device.read():
+                self.__handle(name, buffer, event)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.__set_error(name, e)
+            self.__detach(name)
+
+    def __handle(self, name, buffer, event):
+        if event.type != ecodes.EV_KEY:
+            return
+        press = KeyEvent(event)
+        if press.keystate != KeyEvent.key_down:
+            return
+        char = self.__scan_codes.get(press.scancode)
+        if char is None:
+            return
+        if char == 'enter':
+            if self.parent.is_waiting_card and buffer:
+                self.__deliver(CardEvent(''.join(buffer), time(), name))
+            buffer.clear()
+            return
+        buffer.append(str(char))
@@ -1,41 +1,195 @@
 import logging
+from threading import Thread
+from time import sleep, time
 
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError, OperationFailure
 
 from com.novikov.rfid.AccessLevel import AccessLevel
+from com.novikov.rfid.SchemaMigrator import SchemaMigrator
+from com.novikov.rfid.UserCache import UserCache
 from com.novikov.rfid.UserModel import UserModel
+from com.novikov.rfid.UserSnapshot import UserSnapshot
 
 
 __author__ = 'Ilia Novikov'
 
 
 class DatabaseConnector:
-    def __init__(self, hostname, port, database, collection, credentials=None):
-        self.logger = logging.getLogger()
+    __REFRESH_BATCH = 1000
+    __OFFLINE_BACKOFF = 10
+
+    def __init__(self, hostname, port, database, collection, credentials=None, cache_size=0, cache_refresh=30,
+                 snapshot_path=None, snapshot_refresh=300, lookup_timeout=500, cache_watch=True):
+        self.logger = logging.getLogger('rfid.db')
         self.logger.info("Подключение к БД на {}:{}".format(hostname, port))
         self.__client = MongoClient(hostname, port)
         self.__db = self.__client[database]
+        # Отдельный клиент с жесткими таймаутами для поиска карт: дверь не должна ждать недоступную БД
+        lookup_timeout = int(lookup_timeout)
+        self.__lookup_client = MongoClient(hostname, port,
+                                           connectTimeoutMS=lookup_timeout,
+                                           socketTimeoutMS=lookup_timeout,
+                                           serverSelectionTimeoutMS=lookup_timeout)
+        lookup_db = self.__lookup_client[database]
         if credentials:
             self.logger.info("Использован механизм авторизации логин-пароль")
             self.__db.authenticate(credentials['user'], credentials['password'])
+            lookup_db.authenticate(credentials['user'], credentials['password'])
         self.logger.info("Выбрана коллекция {}".format(collection))
         self.__collection = self.__db[collection]
+        self.__lookup_collection = lookup_db[collection]
+        self.__offline_until = 0
+        self.__migrator = SchemaMigrator(self.__db, collection)
         self.migrate()
+        self.__listeners = []
+        self.__cache = UserCache(cache_size)
+        self.__cache_refresh = int(cache_refresh)
+        self.__snapshot = UserSnapshot(snapshot_path) if snapshot_path else None
+        self.__snapshot_refresh = int(snapshot_refresh)
+        if self.__snapshot and self.__snapshot_refresh > 0:
+            Thread(target=self.__update_snapshot, daemon=True).start()
+        if self.__cache.size > 0:
+            if not cache_watch:
+                # Кэш без отслеживания изменений не обновляется: только для замеров и тестов
+                self.load_cache()
+            elif self.__snapshot and self.__snapshot.is_loaded():
+                # Снимок уже позволяет принимать решения, кэш заполняется в фоне
+                Thread(target=self.__watch, args=(True,), daemon=True).start()
+            else:
+                self.load_cache()
+                Thread(target=self.__watch, daemon=True).start()
+
+    # region Кэш карт и уведомления об изменениях
+
+    def add_listener(self, listener):
+        # listener(cards, user): user равен None, если пользователь удален,
+        # cards равен None, если изменилась вся коллекция
+        self.__listeners.append(listener)
+
+    def __notify(self, cards, user):
+        for listener in self.__listeners:
+            try:
+                listener(cards, user)
+            except Exception as e:
+                self.logger.error("Ошибка обработки изменения пользователя: {}".format(e))
+
+    def load_cache(self):
+        self.logger.info("Загрузка кэша карт, не более {} записей".format(self.__cache.size))
+        self.__cache.clear()
+        for item in self.__collection.find().limit(self.__cache.size):
+            self.__cache.put(item)
+        self.logger.info("В кэш загружено карт: {}".format(len(self.__cache)))
+
+    def get_cache_stats(self):
+        return {
+            'size': len(self.__cache),
+            'limit': self.__cache.size,
+            'hits': self.__cache.hits,
+            'misses': self.__cache.misses,
+            'evictions': self.__cache.evictions
+        }
+
+    def __watch(self, load=False):
+        if load:
+            try:
+                self.load_cache()
+            except PyMongoError as e:
+                self.logger.error("Ошибка загрузки кэша карт: {}".format(e))
+        while True:
+            try:
+                self.__watch_changes()
+            except OperationFailure as e:
+                # Потоки изменений доступны только в наборе реплик
+                self.logger.info("Отслеживание изменений недоступно ({}), кэш будет обновляться каждые {} с".format(
+                    e,
+                    self.__cache_refresh))
+                self.__poll_changes()
+            except PyMongoError as e:
+                self.logger.error("Ошибка отслеживания изменений коллекции: {}".format(e))
+                self.__cache.clear()
+                sleep(self.__cache_refresh)
+
+    def __watch_changes(self):
+        with self.__collection.watch(full_document='updateLookup') as stream:
+            # Изменения, сделанные до открытия потока, могли быть пропущены
+            self.__refresh_cache()
+            for change in stream:
+                operation = change['operationType']
+                if operation in ('insert', 'update', 'replace') and change.get('fullDocument'):
+                    model = change['fullDocument']
+                    cards = self.__cache.discard_id(model[UserCache.ID])
+                    self.__cache.put(model)
+                    self.__notify(cards + model[UserModel.CARDS], UserModel(model=model))
+                elif operation in ('update', 'replace', 'delete'):
+                    self.__notify(self.__cache.discard_id(change['documentKey'][UserCache.ID]), None)
+                else:
+                    self.__cache.clear()
+                    self.__notify(None, None)
+
+    def __poll_changes(self):
+        while True:
+            sleep(self.__cache_refresh)
+            self.__refresh_cache()
+
+    def __refresh_cache(self):
+        cards = self.__cache.get_cards()
+        for i in range(0, len(cards), self.__REFRESH_BATCH):
+            batch = cards[i:i + self.__REFRESH_BATCH]
+            found = set()
+            for item in self.__collection.find({UserModel.CARDS: {'$in': batch}}):
+                found.update(item[UserModel.CARDS])
+                # Слушатели уведомляются только об изменившихся пользователях
+                if any(self.__cache.peek(x) == item for x in item[UserModel.CARDS]):
+                    continue
+                self.__cache.put(item)
+                self.__notify(item[UserModel.CARDS], UserModel(model=item))
+            missing = [x for x in batch if x not in found]
+            self.__cache.discard(missing)
+            if missing:
+                self.__notify(missing, None)
+
+    # endregion
+
+    # region Локальный снимок пользователей
+
+    def __update_snapshot(self):
+        while True:
+            try:
+                self.save_snapshot()
+            except (PyMongoError, OSError) as e:
+                self.logger.error("Ошибка обновления снимка пользователей: {}".format(e))
+            sleep(self.__snapshot_refresh)
+
+    def save_snapshot(self):
+        # Хэши паролей в снимок не попадают: по снимку только принимаются решения у двери
+        fields = {UserModel.CARDS: True, UserModel.NAME: True, UserModel.CREATOR: True, UserModel.ACCESS: True,
+                  UserModel.ACTIVE: True, UserModel.EXPIRE: True, UserModel.SCHEDULE: True}
+        count = UserSnapshot.write(self.__snapshot.filename, self.__collection.find({}, fields))
+        self.__snapshot.load()
+        self.logger.info("Снимок пользователей обновлен, карт: {}".format(count))
+
+    def __get_offline_user(self, card_id):
+        if not self.__snapshot:
+            return None
+        user = self.__snapshot.get_user(card_id)
+        self.logger.warning("Пользователь с ID {} {} в локальном снимке от {}".format(
+            card_id,
+            "найден" if user else "не найден",
+            self.__snapshot.created))
+        return user
+
+    # endregion
 
     def migrate(self):
-        for item in self.__collection.find():
-            if 'ID' in item:
-                card_id = item['ID']
-                self.__collection.update({'ID': card_id},
-                                         {'$set': {UserModel.CARDS: [card_id]},
-                                          '$unset': {'ID': True}})
+        self.__migrator.migrate()
 
     def has_any_developer(self):
         return self.__collection.find({UserModel.ACCESS: AccessLevel.developer.value}).count() != 0
 
     @staticmethod
     def add_db_admin(hostname, port, database, credentials):
-        logging.getLogger().info("Создание администратора БД")
+        logging.getLogger('rfid.db').info("Создание администратора БД")
         client = MongoClient(hostname, port)
         db = client[database]
         db.add_user(credentials['user'], credentials['password'])
@@ -50,17 +204,34 @@ class DatabaseConnector:
                 user.creator,
                 user.name,
                 str(user.access)))
-        result = self.__collection.save(user.get_model())
+        model = user.get_model()
+        result = self.__collection.save(model)
+        self.__cache.put(model)
         self.logger.info("Результат операции: {}".format(result))
 
     def get_user(self, card_id):
-        self.logger.info("Поиск пользователя с ID {}".format(card_id))
-        user = self.__collection.find_one({UserModel.CARDS: card_id})
+        user = self.__cache.get(card_id)
+        if user:
+            self.logger.debug("Пользователь с ID %s найден в кэше", card_id)
+            return user
+        if self.__snapshot and time() < self.__offline_until:
+            return self.__get_offline_user(card_id)
+        # Поиск выполняется на каждое прикладывание карты: сообщения отладочные и форматируются лениво
+        self.logger.debug("Поиск пользователя с ID %s", card_id)
+        try:
+            user = self.__lookup_collection.find_one({UserModel.CARDS: card_id})
+        except PyMongoError as e:
+            if not self.__snapshot:
+                raise
+            self.logger.error("БД недоступна, используется локальный снимок: {}".format(e))
+            self.__offline_until = time() + self.__OFFLINE_BACKOFF
+            return self.__get_offline_user(card_id)
         if user:
-            self.logger.info("Пользователь найден")
+            self.logger.debug("Пользователь с ID %s найден", card_id)
+            self.__cache.put(user)
             return UserModel(model=user)
         else:
-            self.logger.info("Пользователь не найден")
+            self.logger.debug("Пользователь с ID %s не найден", card_id)
             return None
 
     def remove_user(self, user: UserModel, operator: str):
@@ -69,6 +240,8 @@ class DatabaseConnector:
             user.name,
             str(user.access)))
         result = self.__collection.remove(user.get_model())
+        self.__cache.discard(user.cards)
+        self.__notify(user.cards, None)
         self.logger.info("Результат операции: {}".format(result))
 
     def update_user(self, user: UserModel):
@@ -77,6 +250,12 @@ class DatabaseConnector:
                 user.name,
                 str(user.access)))
         result = self.__collection.update({UserModel.CARDS: {'$in': user.cards}}, user.get_model())
+        self.__cache.discard(user.cards)
+        if self.__cache.size > 0:
+            model = self.__collection.find_one({UserModel.CARDS: {'$in': user.cards}})
+            if model:
+                self.__cache.put(model)
+        self.__notify(user.cards, user)
         self.logger.info("Результат операции: {}".format(result))
 
     def get_all_users(self):
@@ -84,6 +263,11 @@ class DatabaseConnector:
 
     def drop_collection(self):
         self.__collection.drop()
+        self.__db.drop_collection(SchemaMigrator.get_meta_name(self.__collection.name))
+        self.__cache.clear()
+        if self.__snapshot:
+            self.__snapshot.remove()
+        self.__notify(None, None)
 
     def drop_db_user(self, user):
         self.__db.remove_user(user)
\ No newline at end of file
@@ -0,0 +1,65 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+
+
+__author__ = 'Ilia Novikov'
+
+
+class DeviceWatcher:
+    IN_ATTRIB = 0x00000004
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_IGNORED = 0x00008000
+    __IN_NONBLOCK = 0o4000
+    __IN_CLOEXEC = 0o2000000
+    __MASK = IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+    __EVENT = struct.Struct('iIII')
+    __BUFFER = 4096
+
+    def __init__(self):
+        self.__libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.__fd = self.__libc.inotify_init1(self.__IN_NONBLOCK | self.__IN_CLOEXEC)
+        if self.__fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.__watches = {}
+
+    def fileno(self):
+        return self.__fd
+
+    def watch(self, directory):
+        if directory in self.__watches.values():
+            return True
+        descriptor = self.__libc.inotify_add_watch(self.__fd, os.fsencode(directory), self.__MASK)
+        if descriptor < 0:
+            return False
+        self.__watches[descriptor] = directory
+        return True
+
+    def read(self):
+        # Возвращает список (каталог, имя файла, маска)
+        try:
+            data = os.read(self.__fd, self.__BUFFER)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + self.__EVENT.size <= len(data):
+            descriptor, mask, _, length = self.__EVENT.unpack_from(data, offset)
+            offset += self.__EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            directory = self.__watches.get(descriptor)
+            if mask & self.IN_IGNORED:
+                self.__watches.pop(descriptor, None)
+            if directory is not None:
+                events.append((directory, name, mask))
+        return events
+
+    def close(self):
+        os.close(self.__fd)
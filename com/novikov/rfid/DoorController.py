@@ -0,0 +1,77 @@
+import logging
+from threading import Lock, Timer
+from time import monotonic
+
+from com.novikov.rfid.DoorMode import DoorMode
+from com.novikov.rfid.SerialConnector import SerialConnector
+
+
+__author__ = 'Ilia Novikov'
+
+
+class DoorController:
+    def __init__(self, serial: SerialConnector):
+        self.logger = logging.getLogger('rfid.door')
+        self.serial = serial
+        self.mode = DoorMode.STANDARD
+        self.open_until = None
+        self.__timer = None
+        self.__lock = Lock()
+
+    def __apply_mode(self):
+        {
+            DoorMode.STANDARD: self.serial.standard,
+            DoorMode.LOCK: self.serial.lock,
+            DoorMode.MAINTENANCE: self.serial.maintenance
+        }[self.mode]()
+
+    def is_open(self):
+        with self.__lock:
+            return self.__timer is not None
+
+    def unlock(self, duration):
+        with self.__lock:
+            # Монотонные часы: перевод системного времени не должен оставить дверь открытой
+            until = monotonic() + duration
+            if self.__timer is not None:
+                # Повторное открытие продлевает уже открытое окно, а не накладывает задержки друг на друга
+                if until <= self.open_until:
+                    return
+                self.__timer.cancel()
+            self.serial.open()
+            self.open_until = until
+            self.__arm(duration)
+
+    def __arm(self, delay):
+        timer = Timer(delay, lambda: self.__relock(timer))
+        timer.daemon = True
+        self.__timer = timer
+        timer.start()
+
+    def __relock(self, timer):
+        with self.__lock:
+            # Отмененный таймер мог сработать, пока ждал блокировку
+            if timer is not self.__timer:
+                return
+            remaining = self.open_until - monotonic()
+            if remaining > 0.001:
+                self.__arm(remaining)
+                return
+            self.__timer = None
+            self.open_until = None
+            self.__apply_mode()
+
+    def set_mode(self, mode):
+        with self.__lock:
+            self.mode = mode
+            # Пока дверь открыта, режим будет применен при закрытии
+            if self.__timer is None:
+                self.__apply_mode()
+
+    def close(self):
+        with self.__lock:
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+                self.open_until = None
+                self.__apply_mode()
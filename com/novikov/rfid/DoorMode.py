@@ -0,0 +1,8 @@
+__author__ = 'Ilia Novikov'
+
+
+class DoorMode:
+    # Режимы двери без зависимостей от оборудования: используются и контроллером, и политикой доступа
+    STANDARD = 'standard'
+    LOCK = 'lock'
+    MAINTENANCE = 'maintenance'
@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import re
+import struct
+from threading import Lock
+from time import time
+
+from com.novikov.rfid.LogWriter import LogWriter
+from com.novikov.rfid.UserModel import UserModel
+
+
+__author__ = 'Ilia Novikov'
+
+
+class EventStore:
+    # События хранятся посуточными сегментами JSONL, рядом с каждым - разреженный индекс
+    # записей (время, смещение), по которому запрос начинает чтение сегмента не с начала
+    SEGMENT_EXTENSION = '.jsonl'
+    INDEX_EXTENSION = '.idx'
+    INDEX_STEP = 16 * 1024
+    __INDEX_RECORD = struct.Struct('<dQ')
+    __SEGMENT_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})\.jsonl$')
+
+    START = 'start'
+    VISIT = 'visit'
+    WRONG_ID = 'wrong_id'
+    WRONG_PASSWORD = 'wrong_password'
+    WRONG_ACCESS = 'wrong_access'
+    INACTIVE = 'inactive'
+    EXPIRED = 'expired'
+    OFF_SCHEDULE = 'off_schedule'
+    DOOR_CLOSED = 'door_closed'
+    EXIT = 'exit'
+    DENIALS = [WRONG_ID, WRONG_PASSWORD, WRONG_ACCESS, INACTIVE, EXPIRED, OFF_SCHEDULE, DOOR_CLOSED]
+
+    TIMESTAMP = 'ts'
+    CARD = 'card'
+    USER = 'user'
+    ACCESS = 'access'
+    OUTCOME = 'outcome'
+    READER = 'reader'
+
+    def __init__(self, directory, writer: LogWriter):
+        self.logger = logging.getLogger('rfid.logs')
+        self.directory = directory
+        self.writer = writer
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.__segment = None
+        self.__size = 0
+        self.__indexed = 0
+        self.__lock = Lock()
+
+    def record(self, outcome, user: UserModel=None, card_id=None, reader=None, timestamp=None):
+        event = {
+            self.TIMESTAMP: timestamp if timestamp is not None else time(),
+            self.CARD: card_id,
+            self.USER: user.name if user else None,
+            self.ACCESS: str(user.access) if user else None,
+            self.OUTCOME: outcome,
+            self.READER: reader
+        }
+        self.__append(event)
+        return event
+
+    @staticmethod
+    def __get_segment(timestamp):
+        return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+
+    def __get_path(self, segment, extension):
+        return os.path.join(self.directory, segment + extension)
+
+    def __append(self, event):
+        line = (json.dumps(event, ensure_ascii=False) + '\n').encode()
+        segment = self.__get_segment(event[self.TIMESTAMP])
+        filename = self.__get_path(segment, self.SEGMENT_EXTENSION)
+        with self.__lock:
+            if segment != self.__segment:
+                # Записи пишутся в фоне, поэтому размер сегмента отслеживается в памяти
+                self.writer.flush()
+                self.__segment = segment
+                self.__size = os.path.getsize(filename) if os.path.exists(filename) else 0
+                self.__indexed = self.__get_last_indexed(segment)
+            offset = self.__size
+            if offset == 0 or offset - self.__indexed >= self.INDEX_STEP:
+                self.writer.write(self.__get_path(segment, self.INDEX_EXTENSION),
+                                  self.__INDEX_RECORD.pack(event[self.TIMESTAMP], offset))
+                self.__indexed = offset
+            self.writer.write(filename, line)
+            self.__size += len(line)
+
+    def __read_index(self, segment):
+        try:
+            with open(self.__get_path(segment, self.INDEX_EXTENSION), mode='rb') as index:
+                data = index.read()
+        except FileNotFoundError:
+            return []
+        size = self.__INDEX_RECORD.size
+        return [self.__INDEX_RECORD.unpack_from(data, x) for x in range(0, len(data) - len(data) % size, size)]
+
+    def __get_last_indexed(self, segment):
+        index = self.__read_index(segment)
+        return index[-1][1] if index else -self.INDEX_STEP
+
+    def get_segments(self):
+        return sorted(x.group(1) for x in map(self.__SEGMENT_PATTERN.match, os.listdir(self.directory)) if x)
+
+    def __get_start_offset(self, segment, since):
+        # Последняя точка индекса не позже since; записи до нее заведомо старше
+        offset = 0
+        for timestamp, position in self.__read_index(segment):
+            if timestamp > since:
+                break
+            offset = position
+        return offset
+
+    def query(self, card_id=None, outcome=None, since: datetime=None, until: datetime=None, limit=None):
+        outcomes = [outcome] if isinstance(outcome, str) else outcome
+        start = since.timestamp() if since else None
+        end = until.timestamp() if until else None
+        first = since.strftime('%Y-%m-%d') if since else None
+        last = until.strftime('%Y-%m-%d') if until else None
+        result = []
+        self.writer.flush()
+        for segment in self.get_segments():
+            # Сегменты вне интервала не читаются
+            if (first and segment < first) or (last and segment > last):
+                continue
+            offset = self.__get_start_offset(segment, start) if start and segment == first else 0
+            with open(self.__get_path(segment, self.SEGMENT_EXTENSION), mode='rb') as file:
+                file.seek(offset)
+                for line in file:
+                    try:
+                        event = json.loads(line.decode())
+                    except ValueError:
+                        continue
+                    if start and event[self.TIMESTAMP] < start:
+                        continue
+                    if end and event[self.TIMESTAMP] > end:
+                        break
+                    if card_id is not None and event[self.CARD] != card_id:
+                        continue
+                    if outcomes and event[self.OUTCOME] not in outcomes:
+                        continue
+                    result.append(event)
+                    if limit and len(result) >= limit:
+                        return result
+        return result
+
+    def get_denials(self, card_id, days=7):
+        return self.query(card_id=card_id, outcome=self.DENIALS, since=datetime.now() - timedelta(days=days))
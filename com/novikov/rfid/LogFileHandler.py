@@ -0,0 +1,24 @@
+import logging.handlers
+
+
+__author__ = 'Ilia Novikov'
+
+
+class LogFileHandler(logging.handlers.BaseRotatingHandler):
+    # Логи приложения и запросов ротируются тем же LogRotator, что и логи посещений:
+    # по размеру и по возрасту, с тем же числом хранимых сегментов
+    def __init__(self, filename, rotator):
+        super().__init__(filename, mode='a', delay=True)
+        self.rotator = rotator
+
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        self.stream.seek(0, 2)
+        return self.rotator.should_rotate(self.baseFilename, self.stream.tell())
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.rotator.rotate(self.baseFilename)
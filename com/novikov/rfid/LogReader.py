@@ -0,0 +1,218 @@
+from datetime import datetime
+import gzip
+from io import BytesIO
+import os
+
+from com.novikov.rfid.LogRotator import LogRotator
+
+
+__author__ = 'Ilia Novikov'
+
+
+class LogReader:
+    BLOCK = 8 * 1024
+    SEPARATOR = '----'
+
+    def __init__(self, filename, date_format=None, encoding='utf-8'):
+        self.filename = filename
+        self.date_format = date_format
+        self.encoding = encoding
+
+    def exists(self):
+        return os.path.exists(self.filename) or bool(LogRotator.get_segments(self.filename))
+
+    @staticmethod
+    def parse_cursor(cursor):
+        # Курсор - номер сегмента (0 - текущий файл) и смещение начала строки в нем
+        segment, _, offset = cursor.partition(':')
+        return int(segment), int(offset)
+
+    @staticmethod
+    def format_cursor(segment, offset):
+        return '{}:{}'.format(segment, offset)
+
+    def page(self, limit=20, before=None, after=None, since=None, until=None):
+        # Читается только нужная часть лога: сегменты вне интервала дат пропускаются по времени
+        # изменения, границы внутри сегмента находятся двоичным поиском
+        segments = self.__get_segments(since, until)
+        if not segments:
+            items, older, newer = [], None, None
+        elif after is not None:
+            items, older, newer = self.__page_forward(segments, limit, self.parse_cursor(after), since, until)
+        else:
+            cursor = self.parse_cursor(before) if before is not None else None
+            items, older, newer = self.__page_backward(segments, limit, cursor, since, until)
+        return {
+            'items': items,
+            'older': self.format_cursor(*older) if older else None,
+            'newer': self.format_cursor(*newer) if newer else None
+        }
+
+    def get_date(self, line):
+        index = line.find(': ')
+        if index < 0:
+            return None
+        try:
+            return datetime.strptime(line[:index], self.date_format)
+        except ValueError:
+            return None
+
+    def __get_segments(self, since, until):
+        # Номера сегментов от нового к старому; сегмент содержит записи между временем
+        # изменения предыдущего (более старого) сегмента и своим
+        numbers = ([0] if os.path.exists(self.filename) else []) + LogRotator.get_segments(self.filename)
+        times = [os.path.getmtime(LogRotator.get_segment_name(self.filename, x)) for x in numbers]
+        segments = []
+        for index, number in enumerate(numbers):
+            if since and times[index] < since.timestamp():
+                continue
+            if until and index + 1 < len(numbers) and times[index + 1] > until.timestamp():
+                continue
+            segments.append(number)
+        return segments
+
+    def __open(self, number):
+        if number == 0:
+            return open(self.filename, mode='rb')
+        with gzip.open(LogRotator.get_segment_name(self.filename, number), mode='rb') as file:
+            return BytesIO(file.read())
+
+    def __get_bounds(self, file, since, until):
+        size = file.seek(0, os.SEEK_END)
+        lower = self.__bisect(file, size, since, strict=False) if since else 0
+        upper = self.__bisect(file, size, until, strict=True) if until else size
+        return lower, upper
+
+    def __page_backward(self, segments, limit, cursor, since, until):
+        newest = segments[0]
+        if cursor:
+            oldest = segments[-1]
+            segments = [x for x in segments if x >= cursor[0]]
+            if not segments:
+                # Сегмент курсора удален ротацией: старых записей нет, ссылка ведет к началу самого старого
+                return [], None, (oldest, 0)
+            offset = cursor[1] if segments[0] == cursor[0] else None
+        else:
+            offset = None
+        items, older, newer = [], None, None
+        for index, number in enumerate(segments):
+            with self.__open(number) as file:
+                lower, upper = self.__get_bounds(file, since, until)
+                end = upper if offset is None else min(max(self.__align(file, offset), lower), upper)
+                if index == 0 and (end < upper or number > newest):
+                    newer = (number, end)
+                chunk = self.__backward(file, end, lower, limit - len(items))
+            offset = None
+            items = [x[1] for x in chunk] + items
+            if chunk:
+                older = (number, chunk[0][0]) if chunk[0][0] > lower or index + 1 < len(segments) else None
+            elif index + 1 == len(segments):
+                older = None
+            if len(items) >= limit:
+                break
+        return items, older, newer
+
+    def __page_forward(self, segments, limit, cursor, since, until):
+        oldest = segments[-1]
+        segments = [x for x in reversed(segments) if x <= cursor[0]]
+        offset = cursor[1] if segments and segments[0] == cursor[0] else None
+        items, older, newer = [], None, None
+        for index, number in enumerate(segments):
+            with self.__open(number) as file:
+                lower, upper = self.__get_bounds(file, since, until)
+                start = lower if offset is None else min(max(self.__align(file, offset), lower), upper)
+                if index == 0 and (start > lower or number < oldest):
+                    older = (number, start)
+                chunk, end = self.__forward(file, start, upper, limit - len(items))
+            offset = None
+            items.extend(x[1] for x in chunk)
+            newer = (number, end) if end < upper or index + 1 < len(segments) else None
+            if len(items) >= limit:
+                break
+        return items, older, newer
+
+    def __decode(self, line):
+        return line.decode(self.encoding, errors='replace').strip()
+
+    def __is_event(self, line):
+        return line and not line.startswith(self.SEPARATOR)
+
+    @staticmethod
+    def __align(file, offset):
+        # Курсор из адресной строки может указывать в середину строки
+        if offset <= 0:
+            return 0
+        file.seek(offset - 1)
+        if file.read(1) == b'\n':
+            return offset
+        file.readline()
+        return file.tell()
+
+    def __forward(self, file, start, upper, limit):
+        items = []
+        position = start
+        file.seek(start)
+        while position < upper and len(items) < limit:
+            line = file.readline()
+            if not line:
+                break
+            text = self.__decode(line)
+            if self.__is_event(text):
+                items.append((position, text))
+            position += len(line)
+        return items, position
+
+    def __backward(self, file, end, lower, limit):
+        items = []
+        if limit <= 0:
+            return items
+        for start, line in self.__reversed_lines(file, end, lower):
+            text = self.__decode(line)
+            if self.__is_event(text):
+                items.append((start, text))
+                if len(items) == limit:
+                    break
+        items.reverse()
+        return items
+
+    def __reversed_lines(self, file, end, lower):
+        pending = b''
+        position = end
+        while position > lower:
+            size = min(self.BLOCK, position - lower)
+            position -= size
+            file.seek(position)
+            pending = file.read(size) + pending
+            while True:
+                # Последний символ - перевод строки текущей строки, ищется конец предыдущей
+                index = pending.rfind(b'\n', 0, len(pending) - 1)
+                if index < 0:
+                    break
+                yield position + index + 1, pending[index + 1:]
+                pending = pending[:index + 1]
+        if pending:
+            yield lower, pending
+
+    def __next_event(self, file, offset):
+        # Первая строка с датой, начинающаяся не раньше offset: (начало, конец, дата)
+        position = self.__align(file, offset)
+        file.seek(position)
+        for line in iter(file.readline, b''):
+            date = self.get_date(self.__decode(line))
+            if date:
+                return position, position + len(line), date
+            position += len(line)
+        return None
+
+    def __bisect(self, file, size, date, strict):
+        # Смещение первой строки с датой >= date (> date при strict)
+        lower, upper = 0, size
+        while lower < upper:
+            middle = (lower + upper) // 2
+            event = self.__next_event(file, middle)
+            if event is None or event[2] > date or (event[2] == date and not strict):
+                upper = middle
+            else:
+                lower = event[1]
+                upper = max(upper, lower)
+        return lower
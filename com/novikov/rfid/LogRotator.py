@@ -0,0 +1,77 @@
+import gzip
+import logging
+import os
+import re
+import shutil
+from time import time
+
+
+__author__ = 'Ilia Novikov'
+
+
+class LogRotator:
+    # Сегменты именуются как у logging.handlers.RotatingFileHandler: visits.log.1.gz - самый новый
+    MAX_SIZE = 1024 * 1024
+    MAX_AGE = 7 * 24 * 60 * 60
+    RETENTION = 10
+    EXTENSION = '.gz'
+
+    def __init__(self, max_size=MAX_SIZE, max_age=MAX_AGE, retention=RETENTION):
+        self.logger = logging.getLogger('rfid.logs')
+        self.max_size = max_size
+        self.max_age = max_age
+        self.retention = retention
+        self.__started = {}
+
+    @classmethod
+    def get_segment_name(cls, filename, number):
+        return filename if number == 0 else '{}.{}{}'.format(filename, number, cls.EXTENSION)
+
+    @classmethod
+    def get_segments(cls, filename):
+        directory, name = os.path.split(filename)
+        pattern = re.compile(r'^{}\.(\d+){}$'.format(re.escape(name), re.escape(cls.EXTENSION)))
+        try:
+            names = os.listdir(directory or '.')
+        except FileNotFoundError:
+            return []
+        return sorted(int(x.group(1)) for x in map(pattern.match, names) if x)
+
+    @classmethod
+    def namer(cls, name):
+        return name + cls.EXTENSION
+
+    @staticmethod
+    def compress(source, destination):
+        with open(source, mode='rb') as original, gzip.open(destination, mode='wb') as compressed:
+            shutil.copyfileobj(original, compressed)
+        os.remove(source)
+
+    @classmethod
+    def remove(cls, filename):
+        for number in cls.get_segments(filename):
+            os.remove(cls.get_segment_name(filename, number))
+        if os.path.exists(filename):
+            os.remove(filename)
+
+    def should_rotate(self, filename, size):
+        if size <= 0:
+            return False
+        if self.max_size and size >= self.max_size:
+            return True
+        # Возраст отсчитывается с первой записи в файл после запуска или ротации
+        started = self.__started.setdefault(filename, time())
+        return bool(self.max_age) and time() - started >= self.max_age
+
+    def rotate(self, filename):
+        for number in sorted(self.get_segments(filename), reverse=True):
+            if number >= self.retention:
+                os.remove(self.get_segment_name(filename, number))
+            else:
+                os.replace(self.get_segment_name(filename, number), self.get_segment_name(filename, number + 1))
+        if self.retention > 0:
+            self.compress(filename, self.get_segment_name(filename, 1))
+        else:
+            os.remove(filename)
+        self.__started[filename] = time()
+        self.logger.info("Выполнена ротация лога {}".format(filename))
@@ -0,0 +1,177 @@
+import atexit
+import logging
+import os
+from queue import Queue, Empty, Full
+from threading import Thread
+from time import monotonic
+
+from com.novikov.rfid.LogRotator import LogRotator
+
+
+__author__ = 'Ilia Novikov'
+
+
+class LogWriter(Thread):
+    # Режимы надежности: fsync после каждой пачки событий, не реже чем раз в interval мс, или никогда
+    DURABILITY_ALWAYS = 'always'
+    DURABILITY_INTERVAL = 'interval'
+    DURABILITY_NEVER = 'never'
+    INTERVAL = 1000
+    QUEUE_SIZE = 1024
+    BATCH = 64
+
+    def __init__(self, durability=DURABILITY_INTERVAL, interval=INTERVAL, queue_size=QUEUE_SIZE):
+        Thread.__init__(self, daemon=True)
+        self.logger = logging.getLogger('rfid.logs')
+        if durability not in [self.DURABILITY_ALWAYS, self.DURABILITY_INTERVAL, self.DURABILITY_NEVER]:
+            self.logger.warning("Неизвестный режим записи логов: {}".format(durability))
+            durability = self.DURABILITY_INTERVAL
+        self.durability = durability
+        self.interval = interval / 1000
+        self.written = 0
+        self.batches = 0
+        self.syncs = 0
+        self.__queue = Queue(maxsize=queue_size)
+        self.__files = {}
+        self.__rotators = {}
+        self.__dirty = set()
+        self.__synced = monotonic()
+        self.__closed = False
+        atexit.register(self.close)
+        self.start()
+
+    def write(self, filename, data):
+        # Очередь ограничена: при переполнении вызывающий поток ждет, события не теряются.
+        # Если поток записи остановлен, событие пишется сразу, чтобы не ждать очередь вечно
+        data = data.encode() if isinstance(data, str) else data
+        while not self.__closed and self.is_alive():
+            try:
+                self.__queue.put((filename, data), timeout=self.interval)
+                return
+            except Full:
+                continue
+        self.__write_now(filename, data)
+
+    def flush(self):
+        # Ждет, пока все поставленные в очередь события будут записаны в файлы
+        if not self.__closed and self.is_alive():
+            self.__queue.join()
+
+    def close(self):
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__queue.put(None)
+        self.join()
+        self.logger.info("Запись логов завершена, событий: {}, пачек: {}, fsync: {}".format(
+            self.written,
+            self.batches,
+            self.syncs))
+
+    def set_rotator(self, filename, rotator: LogRotator):
+        self.__rotators[filename] = rotator
+
+    def release(self, filename):
+        # Закрывает файл перед удалением снаружи, иначе записи продолжат уходить в удаленный файл
+        if self.__closed or not self.is_alive():
+            return
+        self.__queue.put((filename, None))
+        self.flush()
+
+    def run(self):
+        while True:
+            try:
+                item = self.__queue.get(timeout=self.interval)
+            except Empty:
+                self.__safe_sync(force=False)
+                continue
+            batch = [item]
+            while item is not None and len(batch) < self.BATCH:
+                try:
+                    item = self.__queue.get_nowait()
+                except Empty:
+                    break
+                batch.append(item)
+            stop = batch[-1] is None
+            try:
+                self.__write_batch([x for x in batch if x is not None])
+            except OSError as e:
+                self.logger.error("Ошибка записи лога: {}".format(e))
+            finally:
+                for _ in batch:
+                    self.__queue.task_done()
+            if stop:
+                self.__safe_sync(force=True)
+                for file in self.__files.values():
+                    try:
+                        file.close()
+                    except OSError as e:
+                        self.logger.error("Ошибка закрытия лога: {}".format(e))
+                self.__files.clear()
+                return
+
+    def __write_batch(self, batch):
+        for filename, data in batch:
+            if data is None:
+                file = self.__files.pop(filename, None)
+                self.__dirty.discard(filename)
+                if file:
+                    file.close()
+                continue
+            file = self.__get_file(filename)
+            file.write(data)
+            self.__dirty.add(filename)
+            rotator = self.__rotators.get(filename)
+            if rotator and rotator.should_rotate(filename, file.tell()):
+                self.__rotate(filename, rotator)
+        for filename in self.__dirty:
+            self.__files[filename].flush()
+        self.written += len(batch)
+        self.batches += 1
+        self.__safe_sync(force=self.durability == self.DURABILITY_ALWAYS)
+
+    def __rotate(self, filename, rotator):
+        file = self.__files.pop(filename)
+        file.flush()
+        if self.durability != self.DURABILITY_NEVER:
+            os.fsync(file.fileno())
+        file.close()
+        self.__dirty.discard(filename)
+        rotator.rotate(filename)
+
+    def __get_file(self, filename):
+        file = self.__files.get(filename)
+        # Файл, удаленный снаружи (очистка лога), открывается заново
+        if file is not None and os.fstat(file.fileno()).st_nlink == 0:
+            file.close()
+            file = None
+        if file is None:
+            file = open(filename, mode='ab')
+            self.__files[filename] = file
+        return file
+
+    def __sync(self, force):
+        if self.durability == self.DURABILITY_NEVER or not self.__dirty:
+            return
+        if not force and monotonic() - self.__synced < self.interval:
+            return
+        for filename in self.__dirty:
+            os.fsync(self.__files[filename].fileno())
+        self.syncs += 1
+        self.__dirty.clear()
+        self.__synced = monotonic()
+
+    def __safe_sync(self, force):
+        # Ошибка fsync (диск заполнен, файл удален) не должна останавливать поток записи
+        try:
+            self.__sync(force)
+        except OSError as e:
+            self.logger.error("Ошибка синхронизации лога: {}".format(e))
+            self.__dirty.clear()
+
+    def __write_now(self, filename, data):
+        try:
+            with open(filename, mode='ab') as file:
+                file.write(data)
+        except OSError as e:
+            self.logger.error("Ошибка записи лога: {}".format(e))
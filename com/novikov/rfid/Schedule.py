@@ -0,0 +1,103 @@
+from datetime import datetime
+import re
+
+
+__author__ = 'Ilia Novikov'
+
+
+class Schedule:
+    # Расписание компилируется в битовую карту минут недели; восьмой "день" - праздничный.
+    # Формат: "mon-fri 09:00-20:00; sat 10:00-14:00; hol never", конец интервала не включается,
+    # интервал через полночь (22:00-06:00) продолжается на следующий день
+    DAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun', 'hol']
+    DAY_MINUTES = 24 * 60
+    MINUTES = len(DAYS) * DAY_MINUTES
+    HOLIDAY = 7
+    ALWAYS = 'always'
+    NEVER = 'never'
+    LEGAL = 'daily 09:00-21:00'
+    __ALIASES = {
+        'daily': 'mon-sun',
+        'weekdays': 'mon-fri',
+        'weekends': 'sat-sun'
+    }
+    __INTERVAL = re.compile(r'^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})$')
+
+    def __init__(self, spec):
+        self.spec = spec.strip()
+        self.__bitmap = bytearray(self.MINUTES // 8)
+        self.__compile(self.spec)
+
+    def __compile(self, spec):
+        if spec.lower() == self.ALWAYS:
+            self.__bitmap[:] = b'\xff' * len(self.__bitmap)
+            return
+        if spec.lower() == self.NEVER or not spec:
+            return
+        for entry in [x.strip() for x in spec.split(';') if x.strip()]:
+            parts = entry.lower().split()
+            if len(parts) != 2:
+                raise ValueError("Неверная запись расписания: {}".format(entry))
+            days, interval = parts
+            if interval == self.NEVER:
+                continue
+            if interval == self.ALWAYS:
+                interval = '00:00-24:00'
+            start, end = self.__parse_interval(interval, entry)
+            for day in self.__parse_days(days, entry):
+                # Минуты праздничного дня не переходят на обычную неделю и наоборот
+                offset = day * self.DAY_MINUTES
+                if day == self.HOLIDAY:
+                    self.__set(offset + start, offset + min(end, self.DAY_MINUTES))
+                    continue
+                for minute in range(start, end):
+                    self.__set_minute((offset + minute) % (self.HOLIDAY * self.DAY_MINUTES))
+
+    def __parse_days(self, days, entry):
+        days = self.__ALIASES.get(days, days)
+        first, _, last = days.partition('-')
+        if first not in self.DAYS or (last and last not in self.DAYS):
+            raise ValueError("Неверные дни в записи расписания: {}".format(entry))
+        first = self.DAYS.index(first)
+        last = self.DAYS.index(last) if last else first
+        if self.HOLIDAY in [first, last] and first != last:
+            raise ValueError("Праздничный день нельзя включать в диапазон: {}".format(entry))
+        # Диапазон дней может переходить через воскресенье: fri-mon
+        return [(first + x) % self.HOLIDAY if first != self.HOLIDAY else first
+                for x in range((last - first) % self.HOLIDAY + 1)]
+
+    def __parse_interval(self, interval, entry):
+        match = self.__INTERVAL.match(interval)
+        if not match:
+            raise ValueError("Неверный интервал в записи расписания: {}".format(entry))
+        start_hour, start_minute, end_hour, end_minute = [int(x) for x in match.groups()]
+        start = start_hour * 60 + start_minute
+        end = end_hour * 60 + end_minute
+        if start >= self.DAY_MINUTES or end > self.DAY_MINUTES or start_minute >= 60 or end_minute >= 60:
+            raise ValueError("Неверный интервал в записи расписания: {}".format(entry))
+        if end <= start:
+            end += self.DAY_MINUTES
+        return start, end
+
+    def __set(self, start, end):
+        for minute in range(start, end):
+            self.__set_minute(minute)
+
+    def __set_minute(self, minute):
+        self.__bitmap[minute >> 3] |= 1 << (minute & 7)
+
+    @classmethod
+    def get_index(cls, now: datetime, holidays=()):
+        # Праздники задаются датами YYYY-MM-DD или ежегодными MM-DD
+        day = cls.HOLIDAY if holidays and (now.strftime('%Y-%m-%d') in holidays or
+                                           now.strftime('%m-%d') in holidays) else now.weekday()
+        return day * cls.DAY_MINUTES + now.hour * 60 + now.minute
+
+    def allows(self, index):
+        return self.__bitmap[index >> 3] >> (index & 7) & 1 == 1
+
+    def is_open(self, now: datetime, holidays=()):
+        return self.allows(self.get_index(now, holidays))
+
+    def __str__(self):
+        return self.spec
@@ -0,0 +1,84 @@
+from datetime import datetime
+import logging
+from time import perf_counter
+
+from pymongo import IndexModel, UpdateOne
+
+from com.novikov.rfid.UserModel import UserModel
+
+
+__author__ = 'Ilia Novikov'
+
+
+class SchemaMigrator:
+    SCHEMA_ID = 'schema'
+    VERSION = 'VERSION'
+    HISTORY = 'HISTORY'
+    __BATCH = 1000
+
+    def __init__(self, db, collection):
+        self.logger = logging.getLogger('rfid.db')
+        self.__collection = db[collection]
+        self.__meta = db[self.get_meta_name(collection)]
+        # Миграции выполняются строго по порядку, номер версии — позиция в списке
+        self.migrations = [
+            ("Перенос поля ID в список CARDS", self.__migrate_cards),
+            ("Создание индексов CARDS, ACCESS, EXPIRE", self.__create_indexes)
+        ]
+
+    @staticmethod
+    def get_meta_name(collection):
+        return collection + '.schema'
+
+    def get_version(self):
+        meta = self.__meta.find_one({'_id': self.SCHEMA_ID})
+        return meta[self.VERSION] if meta else 0
+
+    def migrate(self):
+        version = self.get_version()
+        if version >= len(self.migrations):
+            self.logger.info("Схема БД актуальна, версия {}".format(version))
+            return
+        self.logger.info("Обновление схемы БД с версии {} до версии {}".format(version, len(self.migrations)))
+        total = perf_counter()
+        for number, (description, migration) in enumerate(self.migrations[version:], start=version + 1):
+            start = perf_counter()
+            result = migration()
+            elapsed = (perf_counter() - start) * 1000
+            self.__meta.update_one({'_id': self.SCHEMA_ID},
+                                   {'$set': {self.VERSION: number},
+                                    '$push': {self.HISTORY: {
+                                        'version': number,
+                                        'description': description,
+                                        'result': result,
+                                        'duration_ms': round(elapsed, 3),
+                                        'date': datetime.now()}}},
+                                   upsert=True)
+            self.logger.info("Миграция {} ({}) выполнена за {:.1f} мс: {}".format(
+                number,
+                description,
+                elapsed,
+                result))
+        self.logger.info("Схема БД обновлена за {:.1f} мс".format((perf_counter() - total) * 1000))
+
+    def __migrate_cards(self):
+        updated = 0
+        requests = []
+        for item in self.__collection.find({'ID': {'$exists': True}}, {'ID': True}):
+            requests.append(UpdateOne({'_id': item['_id']},
+                                      {'$set': {UserModel.CARDS: [item['ID']]},
+                                       '$unset': {'ID': True}}))
+            if len(requests) >= self.__BATCH:
+                updated += self.__collection.bulk_write(requests, ordered=False).modified_count
+                requests = []
+        if requests:
+            updated += self.__collection.bulk_write(requests, ordered=False).modified_count
+        return "обновлено документов: {}".format(updated)
+
+    def __create_indexes(self):
+        names = self.__collection.create_indexes([
+            IndexModel(UserModel.CARDS),
+            IndexModel(UserModel.ACCESS),
+            IndexModel(UserModel.EXPIRE)
+        ])
+        return "индексы: {}".format(', '.join(names))
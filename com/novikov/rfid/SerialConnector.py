@@ -1,5 +1,7 @@
+from collections import deque
 import logging
-from time import sleep
+from threading import Thread, Condition
+from time import sleep, perf_counter
 
 from serial import Serial, SerialException
 
@@ -15,34 +17,145 @@ class SerialConnector:
     __CODE_LED_FAIL = 5
     __CODE_MAINTENANCE = 6
     __TIMEOUT = 1
+    # Команды состояния заменяют друг друга: в очереди достаточно последней из них
+    __STATE_CODES = (__CODE_IDLE, __CODE_LOCK, __CODE_MAINTENANCE)
+    __RECONNECT_DELAY = 1
+    # Устаревшая разовая команда (открытие, индикатор) не выполняется: дверь не должна открыться
+    # через минуту после карты. Команды состояния не устаревают и повторяются до успешной записи
+    __MAX_AGE = 2
 
     def __init__(self, device, speed):
-        self.logger = logging.getLogger()
+        self.logger = logging.getLogger('rfid.serial')
         self.logger.info("Подключение к UART-устройству {} на скорости {} бод".format(
             device if device else '???',
             speed
         ))
         self.device = device
         self.speed = int(speed)
+        self.__serial = None
+        self.__queue = deque()
+        self.__condition = Condition()
+        self.__is_running = True
+        self.__stats = {}
+        self.__state = None
+        self.coalesced = 0
+        self.expired = 0
+        self.__writer = Thread(target=self.__write_loop, daemon=True)
+        if self.device:
+            self.__writer.start()
 
-    def __send(self, data):
+    def __send(self, *codes):
         if not self.device:
             self.logger.error("UART-устройство не задано")
             return
-        try:
-            data = str(data).encode()
-            serial = Serial(self.device, self.speed, timeout=self.__TIMEOUT)
-            serial.write(data)
-            sleep(10.0 / 1000.0)
-            serial.close()
-        except SerialException as e:
-            self.logger.error("Ошибка конфигурации UART-устройства: {}".format(e))
-        except ValueError as e:
-            self.logger.error("Ошибка конфигурации UART-устройства: {}".format(e))
+        with self.__condition:
+            for code in codes:
+                if code in self.__STATE_CODES:
+                    pending = len(self.__queue)
+                    self.__queue = deque(x for x in self.__queue if x[0] not in self.__STATE_CODES)
+                    self.coalesced += pending - len(self.__queue)
+                elif self.__queue and self.__queue[-1][0] == code:
+                    self.coalesced += 1
+                    continue
+                self.__queue.append((code, perf_counter()))
+            self.__condition.notify()
+
+    def __write_loop(self):
+        while True:
+            with self.__condition:
+                while self.__is_running and not self.__queue:
+                    self.__condition.wait()
+                if not self.__queue:
+                    return
+                code, queued = self.__queue.popleft()
+            if code not in self.__STATE_CODES and perf_counter() - queued > self.__MAX_AGE:
+                self.__expire()
+                self.logger.warning("Команда {} не отправлена на UART-устройство: истек срок ожидания".format(code))
+                continue
+            self.__write(code, queued)
+
+    def __write(self, code, queued):
+        is_state = code in self.__STATE_CODES
+        while is_state or perf_counter() - queued <= self.__MAX_AGE:
+            try:
+                if self.__serial is None:
+                    self.__open_port(code)
+                start = perf_counter()
+                self.__serial.write(str(code).encode())
+                self.__serial.flush()
+                if is_state:
+                    self.__state = code
+                self.__record(code, perf_counter() - start, perf_counter() - queued)
+                return
+            except (SerialException, ValueError, OSError) as e:
+                self.logger.error("Ошибка конфигурации UART-устройства: {}".format(e))
+                self.__close_port()
+                sleep(self.__RECONNECT_DELAY)
+            # Команда состояния повторяется, пока ее не заменит новая или пока соединение не закрыто
+            if is_state and (self.__is_superseded() or not self.__is_running):
+                return
+        self.__expire()
+
+    def __open_port(self, code):
+        self.__serial = Serial(self.device, self.speed, timeout=self.__TIMEOUT, write_timeout=self.__TIMEOUT)
+        self.logger.info("UART-устройство {} открыто".format(self.device))
+        # Контроллер мог потерять состояние, пока порт был недоступен: последнее состояние повторяется
+        if self.__state is not None and code not in self.__STATE_CODES:
+            self.__serial.write(str(self.__state).encode())
+            self.__serial.flush()
+
+    def __is_superseded(self):
+        with self.__condition:
+            return any(x[0] in self.__STATE_CODES for x in self.__queue)
+
+    def __expire(self):
+        # Счетчик читается вместе с остальной статистикой в get_stats()
+        with self.__condition:
+            self.expired += 1
+
+    def __record(self, code, write, total):
+        with self.__condition:
+            stats = self.__stats.setdefault(code, {'count': 0, 'write_total': 0.0, 'write_max': 0.0,
+                                                   'latency_total': 0.0, 'latency_max': 0.0})
+            stats['count'] += 1
+            stats['write_total'] += write
+            stats['write_max'] = max(stats['write_max'], write)
+            stats['latency_total'] += total
+            stats['latency_max'] = max(stats['latency_max'], total)
+
+    def get_stats(self):
+        with self.__condition:
+            return {
+                'queue': len(self.__queue),
+                'coalesced': self.coalesced,
+                'expired': self.expired,
+                'commands': {code: {
+                    'count': x['count'],
+                    'write_avg_ms': x['write_total'] / x['count'] * 1000,
+                    'write_max_ms': x['write_max'] * 1000,
+                    'latency_avg_ms': x['latency_total'] / x['count'] * 1000,
+                    'latency_max_ms': x['latency_max'] * 1000
+                } for code, x in self.__stats.items()}
+            }
+
+    def __close_port(self):
+        if self.__serial is not None:
+            try:
+                self.__serial.close()
+            except (SerialException, OSError):
+                pass
+        self.__serial = None
+
+    def close(self):
+        with self.__condition:
+            self.__is_running = False
+            self.__condition.notify()
+        if self.__writer.is_alive():
+            self.__writer.join(self.__MAX_AGE + self.__TIMEOUT)
+        self.__close_port()
 
     def open(self):
-        self.__send(self.__CODE_OPEN)
-        self.__send(self.__CODE_LED_OK)
+        self.__send(self.__CODE_OPEN, self.__CODE_LED_OK)
 
     def standard(self):
         self.__send(self.__CODE_IDLE)
@@ -54,4 +167,4 @@ class SerialConnector:
         self.__send(self.__CODE_LED_FAIL)
 
     def maintenance(self):
-        self.__send(self.__CODE_MAINTENANCE)
\ No newline at end of file
+        self.__send(self.__CODE_MAINTENANCE)
@@ -1,6 +1,8 @@
 from configparser import ConfigParser
 from os.path import exists
 
+from com.novikov.rfid.AccessLevel import AccessLevel
+
 
 __author__ = 'Ilia Novikov'
 
@@ -19,6 +21,60 @@ class Settings:
     DELAY_ERROR = 'delay_error'
     DELAY_SUCCESS = 'delay_success'
 
+    __CACHE_SECTION = 'cache'
+    CACHE_SIZE = 'cache_size'
+    CACHE_REFRESH = 'cache_refresh'
+    SNAPSHOT_REFRESH = 'snapshot_refresh'
+    LOOKUP_TIMEOUT = 'lookup_timeout'
+    # Кэш карт включается явно: без потоков изменений (одиночный mongod) заблокированный
+    # или удаленный пользователь открывает дверь из кэша до следующего опроса через cache_refresh секунд
+    __CACHE_DEFAULTS = {
+        CACHE_SIZE: 0,
+        CACHE_REFRESH: 30,
+        SNAPSHOT_REFRESH: 300,
+        LOOKUP_TIMEOUT: 500
+    }
+
+    __SERVER_SECTION = 'server'
+    SERVER_WORKERS = 'workers'
+    SERVER_QUEUE = 'queue_size'
+    SERVER_TIMEOUT = 'timeout'
+    SERVER_KEEP_ALIVE = 'keep_alive'
+    SERVER_MODE_THREADED = 'threaded'
+    SERVER_MODE_ASYNCIO = 'asyncio'
+    __SERVER_DEFAULTS = {
+        SERVER_WORKERS: 8,
+        SERVER_QUEUE: 32,
+        SERVER_TIMEOUT: 30,
+        SERVER_KEEP_ALIVE: 5
+    }
+
+    __WRITER_SECTION = 'writer'
+    WRITER_INTERVAL = 'interval'
+    WRITER_QUEUE = 'queue_size'
+    __WRITER_DEFAULTS = {
+        WRITER_INTERVAL: 1000,
+        WRITER_QUEUE: 1024
+    }
+
+    __ROTATION_SECTION = 'rotation'
+    ROTATION_SIZE = 'max_size'
+    ROTATION_AGE = 'max_age'
+    ROTATION_RETENTION = 'retention'
+    __ROTATION_DEFAULTS = {
+        ROTATION_SIZE: 1024 * 1024,
+        ROTATION_AGE: 7 * 24 * 60 * 60,
+        ROTATION_RETENTION: 10
+    }
+
+    # Уровни логирования по подсистемам: root, rfid.db, rfid.reader, rfid.door, rfid.serial,
+    # rfid.logs, rfid.server, rfid.access
+    __LOGGING_SECTION = 'logging'
+    __LOGGING_DEFAULTS = {
+        'root': 'DEBUG',
+        'rfid.db': 'INFO'
+    }
+
     def __init__(self):
         self.is_first_run = not exists(self.FILENAME)
         self.settings = ConfigParser()
@@ -49,6 +105,65 @@ class Settings:
     def set_delay_option(self, option, value):
         self.__set_option(self.__DELAY_SECTION, option, value)
 
+    def get_cache_option(self, option):
+        return int(self.settings.get(self.__CACHE_SECTION, option, fallback=self.__CACHE_DEFAULTS[option]))
+
+    def get_snapshot_path(self):
+        return self.settings.get(self.__CACHE_SECTION, 'snapshot_path', fallback='users.snapshot') or None
+
+    def set_cache_option(self, option, value):
+        self.__set_option(self.__CACHE_SECTION, option, value)
+
+    def get_server_option(self, option):
+        return int(self.settings.get(self.__SERVER_SECTION, option, fallback=self.__SERVER_DEFAULTS[option]))
+
+    def set_server_option(self, option, value):
+        self.__set_option(self.__SERVER_SECTION, option, value)
+
+    def get_server_mode(self):
+        return self.settings.get(self.__SERVER_SECTION, 'mode', fallback=self.SERVER_MODE_THREADED)
+
+    def get_readers(self):
+        if 'readers' not in self.settings:
+            return None
+        return dict(self.settings.items('readers'))
+
+    def get_writer_option(self, option):
+        return int(self.settings.get(self.__WRITER_SECTION, option, fallback=self.__WRITER_DEFAULTS[option]))
+
+    def get_writer_durability(self):
+        return self.settings.get(self.__WRITER_SECTION, 'durability', fallback='interval')
+
+    def get_rotation_option(self, option):
+        value = int(self.settings.get(self.__ROTATION_SECTION, option, fallback=self.__ROTATION_DEFAULTS[option]))
+        # Без хранимых сегментов ротация удаляла бы текущий лог целиком
+        return max(value, 1) if option == self.ROTATION_RETENTION else value
+
+    def get_log_levels(self):
+        levels = dict(self.__LOGGING_DEFAULTS)
+        if self.__LOGGING_SECTION in self.settings:
+            levels.update(self.settings.items(self.__LOGGING_SECTION))
+        return {name: level.upper() for name, level in levels.items()}
+
+    def get_schedules(self):
+        # Расписания уровней доступа задаются опциями guest, common, privileged, administrator, developer
+        return {x: self.settings.get('schedule', x.name) for x in AccessLevel
+                if self.settings.get('schedule', x.name, fallback=None)}
+
+    def get_legal_schedule(self):
+        # Для событий без пользователя и пользователей без расписания: визиты вне его пишутся в ночной лог
+        return self.settings.get('schedule', 'legal', fallback=None)
+
+    def get_holidays(self):
+        holidays = self.settings.get('schedule', 'holidays', fallback='')
+        return {x.strip() for x in holidays.split(',') if x.strip()}
+
+    def get_events_path(self):
+        # Структурированный журнал событий включается опцией enabled в секции [events]
+        if not self.settings.getboolean('events', 'enabled', fallback=False):
+            return None
+        return self.settings.get('events', 'path', fallback='logs/events')
+
     def get_uart_path(self):
         return self.settings.get('uart', 'path', fallback=None)
 
@@ -0,0 +1,97 @@
+from collections import OrderedDict
+from threading import Lock
+
+from com.novikov.rfid.UserModel import UserModel
+
+
+__author__ = 'Ilia Novikov'
+
+
+class UserCache:
+    ID = '_id'
+
+    def __init__(self, size):
+        self.size = int(size)
+        self.__cards = OrderedDict()
+        self.__ids = {}
+        self.__lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def __copy(model):
+        # Модель в кэше не должна изменяться вызывающим кодом
+        model = dict(model)
+        model[UserModel.CARDS] = list(model[UserModel.CARDS])
+        return model
+
+    def get(self, card_id):
+        with self.__lock:
+            model = self.__cards.get(card_id)
+            if model is None:
+                self.misses += 1
+                return None
+            self.__cards.move_to_end(card_id)
+            self.hits += 1
+        return UserModel(model=self.__copy(model))
+
+    def peek(self, card_id):
+        # Модель без учета в статистике и порядке вытеснения: для сравнения при обновлении кэша
+        with self.__lock:
+            model = self.__cards.get(card_id)
+            return self.__copy(model) if model is not None else None
+
+    def put(self, model):
+        if self.size <= 0:
+            return
+        model = self.__copy(model)
+        with self.__lock:
+            self.__discard_model(self.__ids.get(model.get(self.ID)))
+            self.__discard(model[UserModel.CARDS])
+            for card_id in model[UserModel.CARDS]:
+                self.__cards[card_id] = model
+            if self.ID in model:
+                self.__ids[model[self.ID]] = model
+            while len(self.__cards) > self.size:
+                card_id, evicted = self.__cards.popitem(last=False)
+                self.evictions += 1
+                if not any(self.__cards.get(x) is evicted for x in evicted[UserModel.CARDS]):
+                    self.__ids.pop(evicted.get(self.ID), None)
+
+    def discard(self, cards):
+        with self.__lock:
+            self.__discard(cards)
+
+    def discard_id(self, object_id):
+        with self.__lock:
+            model = self.__ids.get(object_id)
+            self.__discard_model(model)
+        return list(model[UserModel.CARDS]) if model else []
+
+    def __discard(self, cards):
+        # Вместе с картой удаляются все карты того же пользователя,
+        # иначе отвязанная карта продолжит открывать дверь
+        for card_id in list(cards):
+            self.__discard_model(self.__cards.get(card_id))
+
+    def __discard_model(self, model):
+        if model is None:
+            return
+        for card_id in model[UserModel.CARDS]:
+            if self.__cards.get(card_id) is model:
+                del self.__cards[card_id]
+        if self.__ids.get(model.get(self.ID)) is model:
+            del self.__ids[model[self.ID]]
+
+    def get_cards(self):
+        with self.__lock:
+            return list(self.__cards.keys())
+
+    def clear(self):
+        with self.__lock:
+            self.__cards.clear()
+            self.__ids.clear()
+
+    def __len__(self):
+        return len(self.__cards)
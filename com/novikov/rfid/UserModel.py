@@ -15,9 +15,10 @@ class UserModel:
     CREATOR = "CREATOR"
     HASH = "HASH"
     ACTIVE = "ACTIVE"
+    SCHEDULE = "SCHEDULE"
 
     def __init__(self, model=None, creator=None, cards=None, name=None, access=AccessLevel.common,
-                 expire=datetime(2020, 1, 1), active=True):
+                 expire=datetime(2020, 1, 1), active=True, schedule=None):
         if not cards:
             cards = []
         if model:
@@ -28,6 +29,7 @@ class UserModel:
             self.expire = model[self.EXPIRE]
             self.__hash = model[self.HASH]
             self.active = model[self.ACTIVE]
+            self.schedule = model.get(self.SCHEDULE)
         else:
             self.creator = creator
             self.cards = cards
@@ -36,6 +38,7 @@ class UserModel:
             self.expire = expire
             self.__hash = None
             self.active = active
+            self.schedule = schedule
         return
 
     def get_hash(self, password):
@@ -62,5 +65,6 @@ class UserModel:
             self.ACCESS: self.access.value,
             self.EXPIRE: self.expire,
             self.HASH: self.__hash,
-            self.ACTIVE: self.active
+            self.ACTIVE: self.active,
+            self.SCHEDULE: self.schedule
         }
\ No newline at end of file
@@ -0,0 +1,155 @@
+from datetime import datetime
+import json
+import logging
+import mmap
+import os
+import struct
+from threading import Lock
+from time import time
+
+from com.novikov.rfid.UserModel import UserModel
+
+
+__author__ = 'Ilia Novikov'
+
+
+class UserSnapshot:
+    # Заголовок: сигнатура, версия формата, число записей, время создания
+    __HEADER = struct.Struct('<4sHxxIq')
+    # Запись: карта, уровень доступа, активность, срок действия, смещение и длина сведений о пользователе.
+    # Записи отсортированы по карте, поиск выполняется двоичным поиском прямо по mmap
+    __RECORD = struct.Struct('<32sBBxxqII')
+    __MAGIC = b'RFUS'
+    __FORMAT = 2
+    CARD_LENGTH = 32
+
+    def __init__(self, filename):
+        self.logger = logging.getLogger('rfid.db')
+        self.filename = filename
+        self.__lock = Lock()
+        self.__file = None
+        self.__map = None
+        self.count = 0
+        self.created = None
+        self.load()
+
+    def load(self):
+        with self.__lock:
+            self.__close()
+            if not os.path.exists(self.filename) or os.path.getsize(self.filename) < self.__HEADER.size:
+                return False
+            file = open(self.filename, 'rb')
+            try:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError) as e:
+                file.close()
+                self.logger.error("Ошибка чтения снимка пользователей {}: {}".format(self.filename, e))
+                return False
+            magic, version, count, created = self.__HEADER.unpack_from(data, 0)
+            if magic != self.__MAGIC or version != self.__FORMAT:
+                data.close()
+                file.close()
+                self.logger.error("Снимок пользователей {} имеет неизвестный формат".format(self.filename))
+                return False
+            self.__file = file
+            self.__map = data
+            self.count = count
+            self.created = datetime.fromtimestamp(created)
+        self.logger.info("Загружен снимок пользователей от {}, карт: {}".format(self.created, self.count))
+        return True
+
+    def is_loaded(self):
+        return self.__map is not None
+
+    def __close(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__file.close()
+        self.__map = None
+        self.__file = None
+        self.count = 0
+        self.created = None
+
+    def get_user(self, card_id):
+        key = self.__encode_card(card_id)
+        if key is None:
+            return None
+        with self.__lock:
+            if self.__map is None:
+                return None
+            low, high = 0, self.count
+            while low < high:
+                middle = (low + high) // 2
+                offset = self.__HEADER.size + middle * self.__RECORD.size
+                card = self.__map[offset:offset + self.CARD_LENGTH]
+                if card < key:
+                    low = middle + 1
+                elif card > key:
+                    high = middle
+                else:
+                    record = self.__RECORD.unpack_from(self.__map, offset)
+                    info = json.loads(self.__map[record[4]:record[4] + record[5]].decode('utf-8'))
+                    break
+            else:
+                return None
+        _, access, active, expire, _, _ = record
+        return UserModel(model={
+            UserModel.CARDS: info[UserModel.CARDS],
+            UserModel.NAME: info[UserModel.NAME],
+            UserModel.CREATOR: info[UserModel.CREATOR],
+            UserModel.HASH: None,
+            UserModel.SCHEDULE: info.get(UserModel.SCHEDULE),
+            UserModel.ACCESS: access,
+            UserModel.ACTIVE: bool(active),
+            UserModel.EXPIRE: datetime.fromtimestamp(expire)
+        })
+
+    @classmethod
+    def __encode_card(cls, card_id):
+        card = str(card_id).encode('utf-8')
+        if len(card) > cls.CARD_LENGTH:
+            return None
+        return card.ljust(cls.CARD_LENGTH, b'\0')
+
+    @classmethod
+    def write(cls, filename, models):
+        records = []
+        infos = bytearray()
+        for model in models:
+            info = json.dumps({
+                UserModel.CARDS: model[UserModel.CARDS],
+                UserModel.NAME: model[UserModel.NAME],
+                UserModel.CREATOR: model[UserModel.CREATOR],
+                UserModel.SCHEDULE: model.get(UserModel.SCHEDULE)
+            }, ensure_ascii=False).encode('utf-8')
+            expire = model[UserModel.EXPIRE]
+            expire = int(expire.timestamp()) if expire else 0
+            position = len(infos)
+            infos.extend(info)
+            for card_id in model[UserModel.CARDS]:
+                card = cls.__encode_card(card_id)
+                if card is None:
+                    continue
+                records.append((card, int(model[UserModel.ACCESS]), bool(model[UserModel.ACTIVE]), expire,
+                                position, len(info)))
+        records.sort(key=lambda x: x[0])
+        base = cls.__HEADER.size + len(records) * cls.__RECORD.size
+        temporary = filename + '.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(cls.__HEADER.pack(cls.__MAGIC, cls.__FORMAT, len(records), int(time())))
+            for card, access, active, expire, position, length in records:
+                file.write(cls.__RECORD.pack(card, access, active, expire, base + position, length))
+            file.write(infos)
+            file.flush()
+            os.fsync(file.fileno())
+        # В снимке хранятся имена и расписания пользователей
+        os.chmod(temporary, 0o600)
+        # Замена атомарна: читатели видят либо старый, либо новый снимок целиком
+        os.replace(temporary, filename)
+        return len(records)
+
+    def remove(self):
+        with self.__lock:
+            self.__close()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
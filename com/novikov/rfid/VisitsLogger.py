@@ -1,5 +1,9 @@
 from datetime import datetime
 
+from com.novikov.rfid.AccessPolicy import AccessPolicy
+from com.novikov.rfid.EventStore import EventStore
+from com.novikov.rfid.LogWriter import LogWriter
+from com.novikov.rfid.Schedule import Schedule
 from com.novikov.rfid.UserModel import UserModel
 from com.novikov.rfid import __version__
 
@@ -9,63 +13,90 @@ __author__ = 'Ilia Novikov'
 class VisitsLogger:
     VISITS_LOG = 'logs/visits.log'
     ILLEGAL_LOG = 'logs/illegal.log'
+    DATE_FORMAT = '%a, %d %B %Y, %H:%M:%S'
 
-    def __init__(self):
-        if self.__is_legal():
-            with open(self.VISITS_LOG, mode='a') as log:
-                log.write('-------------------------------------------------- \n')
-            self.__append("Приложение запущено, версия: {} \n".format(__version__))
-        else:
-            with open(self.ILLEGAL_LOG, mode='a') as log:
-                log.write('-------------------------------------------------- \n')
-            self.__append("Приложение запущено, версия: {} \n".format(__version__))
-
-    @staticmethod
-    def __get_datetime():
-        return datetime.now().strftime('%a, %d %B %Y, %H:%M:%S: ')
-
-    @staticmethod
-    def __is_legal():
-        return 9 <= datetime.now().hour <= 20
-
-    def __append(self, message):
-        if self.__is_legal():
-            with open(self.VISITS_LOG, mode='a') as visits:
-                visits.write(self.__get_datetime() + message)
-        else:
-            with open(self.ILLEGAL_LOG, mode='a') as illegal:
-                illegal.write(self.__get_datetime() + message)
-
-    def visit(self, user: UserModel):
+    def __init__(self, writer: LogWriter, policy: AccessPolicy=None, schedule: Schedule=None):
+        # Запись в файлы выполняется в фоновом потоке и не задерживает открытие двери
+        self.writer = writer
+        # События вне расписания пользователя пишутся в ночной лог. Общее расписание schedule
+        # применяется к событиям без пользователя и к пользователям без расписания
+        self.policy = policy if policy else AccessPolicy()
+        self.schedule = schedule if schedule else Schedule(Schedule.LEGAL)
+        self.store = None
+        self.writer.write(self.__get_filename(), '-------------------------------------------------- \n')
+        self.__append("Приложение запущено, версия: {} \n".format(__version__))
+
+    def __get_datetime(self):
+        return datetime.now().strftime(self.DATE_FORMAT) + ': '
+
+    def __is_legal(self, user: UserModel=None):
+        schedule = self.policy.get_user_schedule(user) if user else None
+        return (schedule if schedule else self.schedule).is_open(datetime.now(), self.policy.holidays)
+
+    def __get_filename(self, user: UserModel=None):
+        return self.VISITS_LOG if self.__is_legal(user) else self.ILLEGAL_LOG
+
+    def __append(self, message, user: UserModel=None):
+        self.writer.write(self.__get_filename(user), self.__get_datetime() + message)
+
+    def attach_store(self, store: EventStore):
+        # Структурированные события пишутся параллельно с текстовым логом
+        self.store = store
+        self.store.record(EventStore.START)
+
+    def __record(self, outcome, user=None, card_id=None, reader=None):
+        if self.store:
+            self.store.record(outcome, user, card_id, reader)
+
+    def visit(self, user: UserModel, card_id=None, reader=None):
         base = "Вошел {}".format(user.name)
         self.__append("{} ({}) \n".format(
             base,
-            str(user.access)))
+            str(user.access)), user)
+        self.__record(EventStore.VISIT, user, card_id, reader)
 
-    def wrong_password(self, user: UserModel):
+    def wrong_password(self, user: UserModel, card_id=None, reader=None):
         self.__append("Неверный ввод пароля к аккаунту {} ({}) \n".format(
             user.name,
-            str(user.access)))
+            str(user.access)), user)
+        self.__record(EventStore.WRONG_PASSWORD, user, card_id, reader)
 
-    def wrong_id(self, card_id: str):
+    def wrong_id(self, card_id: str, reader=None):
         self.__append("Неверный ID карты: {} \n".format(
             card_id))
+        self.__record(EventStore.WRONG_ID, None, card_id, reader)
 
-    def wrong_access(self, user: UserModel):
+    def wrong_access(self, user: UserModel, card_id=None, reader=None):
         self.__append("Попытка разблокировки с низким уровнем прав: {} ({}) \n".format(
             user.name,
-            str(user.access)))
+            str(user.access)), user)
+        self.__record(EventStore.WRONG_ACCESS, user, card_id, reader)
 
-    def inactive_card(self, user: UserModel):
+    def inactive_card(self, user: UserModel, card_id=None, reader=None):
         self.__append("Попытка разблокировки с заблокированной картой: {} ({}) \n".format(
             user.name,
-            str(user.access)))
+            str(user.access)), user)
+        self.__record(EventStore.INACTIVE, user, card_id, reader)
 
-    def expired(self, user: UserModel):
+    def expired(self, user: UserModel, card_id=None, reader=None):
         self.__append("Попытка разблокировки с устаревшей картой: {} ({}) \n".format(
             user.name,
-            str(user.access)))
+            str(user.access)), user)
+        self.__record(EventStore.EXPIRED, user, card_id, reader)
+
+    def off_schedule(self, user: UserModel, card_id=None, reader=None):
+        self.__append("Попытка прохода вне расписания: {} ({}) \n".format(
+            user.name,
+            str(user.access)), user)
+        self.__record(EventStore.OFF_SCHEDULE, user, card_id, reader)
+
+    def door_closed(self, user: UserModel, card_id=None, reader=None):
+        self.__append("Попытка прохода в режиме без допуска: {} ({}) \n".format(
+            user.name,
+            str(user.access)), user)
+        self.__record(EventStore.DOOR_CLOSED, user, card_id, reader)
 
     def exit(self, user: UserModel):
         self.__append("Разработчик завершил выполнение программы: {} \n".format(
-            user.name))
\ No newline at end of file
+            user.name), user)
+        self.__record(EventStore.EXIT, user)
\ No newline at end of file
@@ -0,0 +1,76 @@
+import gzip
+from hashlib import sha256
+import logging
+import os
+import re
+from threading import Lock
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+__author__ = 'Ilia Novikov'
+
+
+class AssetBundler:
+    PREFIX = '/bundle/'
+    MIMES = {
+        'css': 'text/css',
+        'js': 'application/javascript'
+    }
+    # JS-файлы склеиваются через ';', чтобы файл без завершающей точки с запятой не сломал следующий
+    __SEPARATORS = {
+        'css': b'\n',
+        'js': b';\n'
+    }
+    # Ссылки на карты исходников указывают на файлы рядом с исходным ресурсом, в пакете они ведут в никуда
+    __SOURCE_MAP = re.compile(rb'^[ \t]*(?://[#@][ \t]*sourceMappingURL=[^\r\n]*|'
+                              rb'/\*[#@][ \t]*sourceMappingURL=.*?\*/)[ \t]*\r?$\n?', re.MULTILINE)
+
+    def __init__(self, directory):
+        self.logger = logging.getLogger('rfid.server')
+        self.directory = directory
+        self.__bundles = {}
+        self.__urls = {}
+        self.__lock = Lock()
+
+    def bundle(self, kind, items):
+        key = (kind, tuple(items))
+        with self.__lock:
+            if key in self.__urls:
+                return self.__urls[key]
+            parts = []
+            for item in items:
+                with open(os.path.join(self.directory, kind, '{}.{}'.format(item, kind)), 'rb') as file:
+                    parts.append(self.__SOURCE_MAP.sub(b'', file.read()).rstrip())
+            content = self.__SEPARATORS[kind].join(parts) + b'\n'
+            digest = sha256(content).hexdigest()[:16]
+            url = '{}{}.{}'.format(self.PREFIX, digest, kind)
+            self.__bundles[url] = {
+                'mime': self.MIMES[kind],
+                'etag': '"{}"'.format(digest),
+                'identity': content,
+                'gzip': gzip.compress(content, compresslevel=9),
+                'br': brotli.compress(content) if brotli else None
+            }
+            self.__urls[key] = url
+        self.logger.info("Собран пакет {} из {} ({} байт, gzip {} байт)".format(
+            url,
+            ', '.join(items),
+            len(content),
+            len(self.__bundles[url]['gzip'])))
+        return url
+
+    def get(self, url):
+        return self.__bundles.get(url)
+
+    @staticmethod
+    def choose_encoding(bundle, accept_encoding):
+        accepted = [x.split(';')[0].strip().lower() for x in (accept_encoding or '').split(',')]
+        if bundle['br'] is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return 'identity'
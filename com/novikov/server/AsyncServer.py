@@ -0,0 +1,124 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from threading import Event
+
+from com.novikov.server.BufferedRequest import BufferedRequest
+
+
+__author__ = 'Ilia Novikov'
+
+
+class AsyncServer:
+    HEADERS_LIMIT = 64 * 1024
+    BODY_LIMIT = 1024 * 1024
+
+    def __init__(self, address, handler, secure_context, redirect_port=None, workers=8, timeout=30, keep_alive=5):
+        self.logger = logging.getLogger('rfid.server')
+        self.server_address = address
+        self.handler = handler
+        self.secure_context = secure_context
+        self.redirect_port = redirect_port
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.connections = 0
+        self.__executor = ThreadPoolExecutor(max_workers=workers)
+        self.__loop = asyncio.new_event_loop()
+        self.__servers = []
+        self.__stopped = Event()
+
+    def serve_forever(self):
+        asyncio.set_event_loop(self.__loop)
+        self.__loop.set_default_executor(self.__executor)
+        host, port = self.server_address
+        options = {'ssl': self.secure_context.context, 'ssl_handshake_timeout': self.timeout} \
+            if self.secure_context else {}
+        self.__servers.append(self.__loop.run_until_complete(asyncio.start_server(
+            self.__serve, host, port,
+            limit=self.HEADERS_LIMIT,
+            **options)))
+        if self.redirect_port:
+            self.__servers.append(self.__loop.run_until_complete(asyncio.start_server(
+                self.__redirect, host, self.redirect_port,
+                limit=self.HEADERS_LIMIT)))
+        try:
+            self.__loop.run_forever()
+        finally:
+            self.__stopped.set()
+
+    def shutdown(self):
+        if self.__loop.is_running():
+            self.__loop.call_soon_threadsafe(self.__loop.stop)
+            self.__stopped.wait()
+
+    def server_close(self):
+        for server in self.__servers:
+            server.close()
+            self.__loop.run_until_complete(server.wait_closed())
+        self.__executor.shutdown(wait=True)
+        self.__loop.close()
+
+    async def __read_request(self, reader, idle_timeout=None):
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), idle_timeout or self.timeout)
+        lines = head.decode('iso-8859-1').split('\r\n')
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length > self.BODY_LIMIT:
+            raise ValueError("Слишком большое тело запроса: {}".format(length))
+        body = await asyncio.wait_for(reader.readexactly(length), self.timeout) if length else b''
+        version = lines[0].rsplit(' ', 1)[-1]
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+        return head + body, lines[0], keep_alive
+
+    async def __serve(self, reader, writer):
+        client_address = writer.get_extra_info('peername')
+        self.connections += 1
+        if self.secure_context:
+            # Рукопожатие уже выполнено циклом событий, учитывается только возобновление сессии
+            self.secure_context.record(writer.get_extra_info('ssl_object'))
+        try:
+            idle_timeout = self.timeout
+            while True:
+                data, _, keep_alive = await self.__read_request(reader, idle_timeout)
+                # Следующий запрос в постоянном соединении ждется не дольше keep_alive
+                idle_timeout = self.keep_alive
+                keep_alive = await self.__loop.run_in_executor(None, self.__process, data, client_address, writer,
+                                                               keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                ConnectionError, ValueError):
+            pass
+        except Exception:
+            self.logger.exception("Ошибка обработки запроса от {}".format(client_address[0]))
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def __process(self, data, client_address, writer, keep_alive):
+        # Ответ пишется в транспорт по мере формирования, без буфера на весь ответ
+        request = BufferedRequest(data, client_address, self.__loop, writer, keep_alive, self.timeout)
+        self.handler(request, client_address, self)
+        return request.finish()
+
+    async def __redirect(self, reader, writer):
+        try:
+            _, request_line, _ = await self.__read_request(reader)
+            parts = request_line.split(' ')
+            target = parts[1] if len(parts) > 1 else '/'
+            location = 'https://{}{}'.format(self.server_address[0], target)
+            writer.write('HTTP/1.1 301 Moved Permanently\r\n'
+                         'Location: {}\r\n'
+                         'Content-Length: 0\r\n'
+                         'Connection: close\r\n\r\n'.format(location).encode('iso-8859-1'))
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
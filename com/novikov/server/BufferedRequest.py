@@ -0,0 +1,83 @@
+import asyncio
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from io import BytesIO
+
+
+__author__ = 'Ilia Novikov'
+
+
+class BufferedRequest:
+    # Сокет-заглушка: обработчик BaseHTTPRequestHandler читает готовый запрос из буфера,
+    # а ответ по частям передается в транспорт asyncio. Поток-обработчик ждет drain(),
+    # поэтому большой файл не накапливается в памяти, если клиент читает медленно
+    CHUNK = 64 * 1024
+
+    def __init__(self, data, client_address, loop, writer, keep_alive, timeout):
+        self.__data = data
+        self.__client_address = client_address
+        self.__loop = loop
+        self.__writer = writer
+        self.__timeout = timeout
+        self.keep_alive = keep_alive
+        self.__head = bytearray()
+        self.__is_head_sent = False
+
+    def makefile(self, mode, *args):
+        return BytesIO(self.__data)
+
+    def sendall(self, data):
+        if not self.__is_head_sent:
+            self.__head.extend(data)
+            head, separator, body = self.__head.partition(b'\r\n\r\n')
+            if not separator:
+                return
+            self.__is_head_sent = True
+            self.__head = bytearray()
+            data = self.__frame(bytes(head)) + separator + body
+        view = memoryview(data)
+        for offset in range(0, len(view), self.CHUNK):
+            self.__send(bytes(view[offset:offset + self.CHUNK]))
+
+    def __send(self, chunk):
+        future = asyncio.run_coroutine_threadsafe(self.__write(chunk), self.__loop)
+        try:
+            future.result(self.__timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise ConnectionError("Клиент не принимает ответ")
+
+    async def __write(self, chunk):
+        self.__writer.write(chunk)
+        await self.__writer.drain()
+
+    def __frame(self, head):
+        # Соединение сохраняется, только если клиент может найти конец ответа
+        lines = head.split(b'\r\n')
+        names = [x.split(b':', 1)[0].strip().lower() for x in lines[1:]]
+        status = lines[0].split(b' ')[1] if len(lines[0].split(b' ')) > 1 else b''
+        has_body = not (status.startswith(b'1') or status in (b'204', b'304'))
+        if has_body and b'content-length' not in names:
+            self.keep_alive = False
+        if b'connection' in names:
+            self.keep_alive = self.keep_alive and b'connection: close' not in [x.lower() for x in lines[1:]]
+        else:
+            lines.append(b'Connection: keep-alive' if self.keep_alive else b'Connection: close')
+        return b'\r\n'.join(lines)
+
+    def finish(self):
+        # Незавершенный заголовок отправляется как есть, соединение после него закрывается
+        if not self.__is_head_sent:
+            self.keep_alive = False
+            if self.__head:
+                self.__send(bytes(self.__head))
+        return self.keep_alive
+
+    def settimeout(self, timeout):
+        pass
+
+    def setsockopt(self, *args):
+        # TCP_NODELAY для соединений asyncio устанавливает сам цикл событий
+        pass
+
+    def getpeername(self):
+        return self.__client_address
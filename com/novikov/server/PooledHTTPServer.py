@@ -0,0 +1,65 @@
+from http.server import HTTPServer
+import logging
+from queue import Queue, Full
+from threading import Thread
+
+
+__author__ = 'Ilia Novikov'
+
+
+class PooledHTTPServer(HTTPServer):
+    WORKERS = 8
+    QUEUE_SIZE = 32
+    TIMEOUT = 30
+    KEEP_ALIVE = 5
+
+    def __init__(self, address, handler, workers=WORKERS, queue_size=QUEUE_SIZE, timeout=TIMEOUT,
+                 keep_alive=KEEP_ALIVE):
+        HTTPServer.__init__(self, address, handler)
+        self.logger = logging.getLogger('rfid.server')
+        self.connection_timeout = timeout
+        # Простаивающее постоянное соединение не удерживает поток-обработчик дольше этого времени
+        self.keep_alive = keep_alive
+        self.secure_context = None
+        self.rejected = 0
+        self.__queue = Queue(maxsize=queue_size)
+        self.__workers = [Thread(target=self.__work, daemon=True) for _ in range(workers)]
+        for worker in self.__workers:
+            worker.start()
+
+    def process_request(self, request, client_address):
+        # Таймаут задается до рукопожатия TLS: медленный клиент не займет поток навсегда
+        request.settimeout(self.connection_timeout)
+        try:
+            self.__queue.put_nowait((request, client_address))
+        except Full:
+            self.rejected += 1
+            self.logger.warning("Очередь сервера переполнена, соединение от {} отклонено".format(client_address[0]))
+            self.shutdown_request(request)
+
+    def __work(self):
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def handle_error(self, request, client_address):
+        self.logger.exception("Ошибка обработки запроса от {}".format(client_address[0]))
+
+    def get_queue_depth(self):
+        return self.__queue.qsize()
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        # Уже принятые соединения обслуживаются до конца, затем потоки завершаются
+        for _ in self.__workers:
+            self.__queue.put(None)
+        for worker in self.__workers:
+            worker.join(self.connection_timeout)
@@ -9,6 +9,7 @@ class RedirectionHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         self.send_response(301)
         self.send_header("Location", self.url)
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
     def log_message(self, pattern, *args):
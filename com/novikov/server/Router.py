@@ -0,0 +1,70 @@
+from threading import Lock
+from time import perf_counter
+
+
+__author__ = 'Ilia Novikov'
+
+
+class Router:
+    # Маршрут - (метод, шаблон, имя метода обработчика); шаблон с '*' на конце задает префикс.
+    # Таблица компилируется один раз на класс обработчика, точные адреса ищутся по словарю,
+    # префиксы проверяются от самого длинного
+    def __init__(self, routes):
+        self.__exact = {}
+        self.__prefixes = []
+        self.__lock = Lock()
+        for method, pattern, action in routes:
+            route = {
+                'method': method,
+                'pattern': pattern,
+                'action': action,
+                'count': 0,
+                'errors': 0,
+                'total': 0.0,
+                'max': 0.0
+            }
+            if pattern.endswith('*'):
+                self.__prefixes.append((pattern[:-1], route))
+            else:
+                self.__exact[(method, pattern)] = route
+        self.__prefixes.sort(key=lambda x: len(x[0]), reverse=True)
+
+    def resolve(self, method, path):
+        route = self.__exact.get((method, path))
+        if route:
+            return route
+        for prefix, route in self.__prefixes:
+            if route['method'] == method and path.startswith(prefix):
+                return route
+        return None
+
+    def get_methods(self, path):
+        methods = {method for method, pattern in self.__exact if pattern == path}
+        methods.update(route['method'] for prefix, route in self.__prefixes if path.startswith(prefix))
+        return sorted(methods)
+
+    def dispatch(self, handler, route):
+        start = perf_counter()
+        failed = True
+        try:
+            getattr(handler, route['action'])()
+            failed = False
+        finally:
+            elapsed = perf_counter() - start
+            with self.__lock:
+                route['count'] += 1
+                route['errors'] += failed
+                route['total'] += elapsed
+                route['max'] = max(route['max'], elapsed)
+
+    def get_stats(self):
+        with self.__lock:
+            routes = list(self.__exact.values()) + [x[1] for x in self.__prefixes]
+            return sorted([{
+                'method': x['method'],
+                'pattern': x['pattern'],
+                'count': x['count'],
+                'errors': x['errors'],
+                'avg': round(x['total'] / x['count'] * 1000, 2) if x['count'] else 0,
+                'max': round(x['max'] * 1000, 2)
+            } for x in routes if x['count']], key=lambda x: x['count'], reverse=True)
@@ -0,0 +1,61 @@
+import logging
+import ssl
+from threading import Lock
+from time import perf_counter
+
+
+__author__ = 'Ilia Novikov'
+
+
+class SecureContext:
+    # Только ECDHE с AEAD: прямая секретность и аппаратное ускорение AES на контроллере
+    CIPHERS = 'ECDHE+AESGCM:ECDHE+CHACHA20:!aNULL:!MD5:!DSS'
+
+    def __init__(self, certificate):
+        self.logger = logging.getLogger('rfid.server')
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.minimum_version = ssl.TLSVersion.TLSv1_2
+        self.context.set_ciphers(self.CIPHERS)
+        self.context.options |= ssl.OP_NO_COMPRESSION | ssl.OP_CIPHER_SERVER_PREFERENCE
+        # Билеты сессий позволяют браузеру возобновить сессию без полного рукопожатия
+        self.context.options &= ~ssl.OP_NO_TICKET
+        self.context.load_cert_chain(certificate)
+        self.handshakes = 0
+        self.reused = 0
+        self.failed = 0
+        self.__timed = 0
+        self.__total = 0.0
+        self.__max = 0.0
+        self.__lock = Lock()
+
+    def handshake(self, connection: ssl.SSLSocket):
+        start = perf_counter()
+        try:
+            connection.do_handshake()
+        except (ssl.SSLError, OSError) as e:
+            with self.__lock:
+                self.failed += 1
+            self.logger.debug("Ошибка рукопожатия TLS: {}".format(e))
+            return False
+        self.record(connection, perf_counter() - start)
+        return True
+
+    def record(self, connection, elapsed=None):
+        with self.__lock:
+            self.handshakes += 1
+            if connection is not None and connection.session_reused:
+                self.reused += 1
+            if elapsed is not None:
+                self.__timed += 1
+                self.__total += elapsed
+                self.__max = max(self.__max, elapsed)
+
+    def get_stats(self):
+        with self.__lock:
+            return {
+                'handshakes': self.handshakes,
+                'reused': self.reused,
+                'failed': self.failed,
+                'avg': round(self.__total / self.__timed * 1000, 2) if self.__timed else 0,
+                'max': round(self.__max * 1000, 2)
+            }
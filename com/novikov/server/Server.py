@@ -1,15 +1,18 @@
-from http.server import HTTPServer
 import logging
 import os
 import socket
-import ssl
 from subprocess import Popen
 from threading import Thread
 
 from com.novikov.rfid.DatabaseConnector import DatabaseConnector
-from com.novikov.rfid.SerialConnector import SerialConnector
+from com.novikov.rfid.DoorController import DoorController
+from com.novikov.server.AssetBundler import AssetBundler
+from com.novikov.server.AsyncServer import AsyncServer
+from com.novikov.server.PooledHTTPServer import PooledHTTPServer
 from com.novikov.server.Redirector import Redirector
+from com.novikov.server.SecureContext import SecureContext
 from com.novikov.server.ServerHandler import ServerHandler
+from com.novikov.server.SessionManager import SessionManager
 
 
 __author__ = 'Ilia Novikov'
@@ -22,9 +25,11 @@ class Server(Thread):
     STREAM_SOURCE = '/dev/video0'
     STREAM_BUFFER = 2 * 1024
 
-    def __init__(self, debug: bool, streaming: bool, db: DatabaseConnector, serial: SerialConnector):
+    def __init__(self, debug: bool, streaming: bool, db: DatabaseConnector, door: DoorController,
+                 workers=PooledHTTPServer.WORKERS, queue_size=PooledHTTPServer.QUEUE_SIZE,
+                 timeout=PooledHTTPServer.TIMEOUT, keep_alive=PooledHTTPServer.KEEP_ALIVE, asynchronous=False):
         Thread.__init__(self)
-        self.logger = logging.getLogger()
+        self.logger = logging.getLogger('rfid.server')
         host = self.__resolve_hostname() if debug else socket.gethostname()
         self.logger.info("Сервер был запущен по адресу {}:{}".format(host, self.HTTPS_PORT))
         if not os.path.exists(self.SSL_CERTIFICATE):
@@ -32,17 +37,36 @@ class Server(Thread):
             self.logger.warning("Будет создан новый SSL сертификат")
             print("Создание SSL сертификата для {}".format(host))
             Popen(['./generate'], shell=True).wait()
+        if not debug:
+            # В отладочном режиме стили и скрипты подключаются по отдельности, без пакетов
+            ServerHandler.templates.bundler = AssetBundler('www/include')
+            ServerHandler.templates.preload()
+        ServerHandler.static.build()
+        self.sessions = SessionManager()
+        db.add_listener(self.sessions.on_user_changed)
         if streaming:
             self.stream = self.__start_stream(host, self.STREAM_PORT, self.STREAM_SOURCE, self.STREAM_BUFFER)
-            handler = lambda *args: ServerHandler(debug, host, db, serial, self.STREAM_PORT, *args)
+            handler = lambda *args: ServerHandler(debug, host, db, door, self.sessions, self.STREAM_PORT, *args)
         else:
             self.stream = None
             self.logger.info("Поддержка камеры была отключена")
-            handler = lambda *args: ServerHandler(debug, host, db, serial, None, *args)
+            handler = lambda *args: ServerHandler(debug, host, db, door, self.sessions, None, *args)
         binding = (host, self.HTTPS_PORT)
-        self.server = HTTPServer(binding, handler)
-        self.is_running = True
-        self.server.socket = ssl.wrap_socket(self.server.socket, certfile=self.SSL_CERTIFICATE, server_side=True)
+        self.secure_context = SecureContext(self.SSL_CERTIFICATE)
+        if asynchronous:
+            # Перенаправление с HTTP обслуживается тем же циклом событий
+            self.server = AsyncServer(binding, handler, self.secure_context, Redirector.HTTP_PORT, workers, timeout,
+                                      keep_alive)
+            self.logger.info("Сервер работает в режиме asyncio, обработчиков: {}, таймаут соединения: {} с, "
+                             "ожидание следующего запроса: {} с".format(workers, timeout, keep_alive))
+            return
+        self.server = PooledHTTPServer(binding, handler, workers, queue_size, timeout, keep_alive)
+        self.logger.info("Обработчиков запросов: {}, размер очереди: {}, таймаут соединения: {} с, "
+                         "ожидание следующего запроса: {} с".format(workers, queue_size, timeout, keep_alive))
+        # Рукопожатие TLS выполняется в потоке-обработчике, а не в цикле приема соединений
+        self.server.socket = self.secure_context.context.wrap_socket(self.server.socket, server_side=True,
+                                                                     do_handshake_on_connect=False)
+        self.server.secure_context = self.secure_context
         Redirector(host).start()
 
     def __start_stream(self, host, port, source, buffer):
@@ -67,12 +91,24 @@ class Server(Thread):
         return ip
 
     def run(self):
-        while self.__is_running():
-            self.server.handle_request()
-
-    def __is_running(self):
-        return self.is_running
+        self.server.serve_forever()
 
     def stop(self):
-        self.is_running = False
-        self.server.shutdown()
\ No newline at end of file
+        self.logger.info("Остановка сервера")
+        self.server.shutdown()
+        self.server.server_close()
+        for route in ServerHandler.router.get_stats():
+            self.logger.info("Маршрут {} {}: запросов {}, ошибок {}, время {} мс (макс. {} мс)".format(
+                route['method'],
+                route['pattern'],
+                route['count'],
+                route['errors'],
+                route['avg'],
+                route['max']))
+        stats = self.secure_context.get_stats()
+        self.logger.info("TLS: рукопожатий {}, возобновлено сессий {}, ошибок {}, время {} мс (макс. {} мс)".format(
+            stats['handshakes'],
+            stats['reused'],
+            stats['failed'],
+            stats['avg'],
+            stats['max']))
\ No newline at end of file
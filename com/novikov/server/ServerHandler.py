@@ -1,21 +1,23 @@
-from datetime import datetime
-from fnmatch import fnmatch
+from datetime import datetime, timedelta
 from http.server import BaseHTTPRequestHandler
 import json
 import logging
-from os import path
+import ssl
+from time import perf_counter
 from base64 import b64decode
-from string import Template
-from time import sleep
-from urllib.parse import urlparse, parse_qs
-
-from magic import Magic
-from bs4 import BeautifulSoup, Comment
+from http.cookies import SimpleCookie, CookieError
+from urllib.parse import urlparse, parse_qs, urlencode
 
 from com.novikov.rfid.AccessLevel import AccessLevel
 from com.novikov.rfid.DatabaseConnector import DatabaseConnector
-from com.novikov.rfid.SerialConnector import SerialConnector
+from com.novikov.rfid.DoorController import DoorController
+from com.novikov.rfid.LogReader import LogReader
 from com.novikov.rfid.VisitsLogger import VisitsLogger
+from com.novikov.server.AssetBundler import AssetBundler
+from com.novikov.server.Router import Router
+from com.novikov.server.SessionManager import SessionManager
+from com.novikov.server.StaticFiles import StaticFiles
+from com.novikov.server.TemplateCache import TemplateCache
 
 
 __author__ = 'Ilia Novikov'
@@ -23,101 +25,212 @@ __author__ = 'Ilia Novikov'
 
 class ServerHandler(BaseHTTPRequestHandler):
     REQUESTS_LOG = 'logs/requests.log'
+    ACCESS_LOGGER = 'rfid.access'
+    DOOR_DELAY = 2
+    LOGS_PAGE = 20
+    # Постоянные соединения: каждый ответ обязан содержать Content-Length
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят отдельными записями: с алгоритмом Нейгла ответ ждал бы отложенного ACK клиента
+    disable_nagle_algorithm = True
+    templates = TemplateCache('www/templates/')
+    access_logger = logging.getLogger(ACCESS_LOGGER)
+    static = StaticFiles('www/include')
+    ROUTES = [
+        ('GET', '/', 'redirect_home'),
+        ('GET', '/home', 'generate_home'),
+        ('GET', '/logs', 'generate_logs'),
+        ('GET', '/camera', 'generate_camera'),
+        ('GET', '/door', 'confirm_door'),
+        ('POST', '/door', 'generate_door'),
+        ('POST', '/logout', 'logout'),
+        ('GET', '/control', 'generate_control_panel'),
+        ('GET', '/control/add-user', 'control_add_user'),
+        ('GET', '/control/*', 'generate_not_found'),
+        ('GET', '/request/test', 'ajax_test'),
+        ('GET', '/request/validate', 'validate_card'),
+        ('GET', '/request/*', 'ajax_not_found'),
+        ('GET', AssetBundler.PREFIX + '*', 'send_bundle')
+    ]
+    router = Router(ROUTES + [('GET', x + '*', 'send_static') for x in StaticFiles.PREFIXES])
 
-    def __init__(self, debug, host, db: DatabaseConnector, serial: SerialConnector, stream_port=None, *args):
-        self.routes = {
-            '/': lambda: self.redirect('/home'),
-            '/home': lambda: self.generate_home(),
-            '/logs': lambda: self.generate_logs(),
-            '/camera': lambda: self.generate_camera(),
-            '/door': lambda: self.generate_door(),
-            '/control': lambda: self.generate_control_panel(),
-            '/control/*': lambda: self.handle_control(),
-            '/request/*': lambda: self.handle_ajax(),
-        }
-        self.directories = {
-            'root': 'www',
-            'templates': 'www/templates/',
-            'include': 'www/include'
-        }
-        self.includes = ['/css/', '/img/', '/fonts/', '/js/']
-        self.mimes = {
-            '.js': 'application/javascript',
-            '.css': 'text/css',
-            '.html': 'text/html',
-            '.ico': 'image/x-icon',
-            '.jpg': 'image/jpeg',
-            '.woff2': 'application/font-woff2',
-            '.woff': 'application/font-woff2',
-            '.ttf': 'application/octet-stream',
-            '.svg': 'image/svg+xml'
-        }
+    def __init__(self, debug, host, db: DatabaseConnector, door: DoorController, sessions: SessionManager,
+                 stream_port=None, *args):
         self.alerts = []
         self.debug = debug
         if self.debug:
             self.alerts.append({'type': 'warning', 'text': "Сервер находится в режиме тестирования", 'is_alert': True})
-        self.logger = logging.getLogger()
+        self.logger = logging.getLogger('rfid.server')
         self.db = db
         self.host = host
-        self.serial = serial
+        self.door = door
+        self.sessions = sessions
         self.stream_port = stream_port
+        self.__user = None
+        self.__is_user_loaded = False
+        self.__pending_headers = []
+        self.__is_secure = True
+        self.__started = None
+        self.__status = None
+        self.__sent = '-'
         BaseHTTPRequestHandler.__init__(self, *args)
 
+    def setup(self):
+        # Рукопожатие TLS выполняется явно, чтобы измерить его длительность
+        secure_context = getattr(self.server, 'secure_context', None)
+        if secure_context and isinstance(self.request, ssl.SSLSocket):
+            self.__is_secure = secure_context.handshake(self.request)
+        BaseHTTPRequestHandler.setup(self)
+
+    def handle(self):
+        if self.__is_secure:
+            BaseHTTPRequestHandler.handle(self)
+
+    def handle_one_request(self):
+        self.__started = None
+        self.__status = None
+        self.__sent = '-'
+        BaseHTTPRequestHandler.handle_one_request(self)
+        if self.__status is not None:
+            self.__log_access()
+        # Между запросами действует таймаут постоянного соединения, во время запроса - таймаут сервера
+        self.__set_timeout('keep_alive')
+
+    def __set_timeout(self, name):
+        timeout = getattr(self.server, name, None)
+        if timeout:
+            self.connection.settimeout(timeout)
+
+    def parse_request(self):
+        # Время ответа считается от получения строки запроса, без ожидания в постоянном соединении
+        self.__started = perf_counter()
+        self.__set_timeout('connection_timeout')
+        return BaseHTTPRequestHandler.parse_request(self)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'content-length':
+            self.__sent = value
+        BaseHTTPRequestHandler.send_header(self, keyword, value)
+
+    def log_request(self, code='-', size='-'):
+        # Строка журнала доступа пишется после отправки ответа, когда известны размер и время
+        self.__status = code.value if hasattr(code, 'value') else code
+
+    def __log_access(self):
+        user = self.__user if self.__is_user_loaded else None
+        elapsed = perf_counter() - self.__started if self.__started else 0
+        # Формат combined с временем ответа в микросекундах, как %D в Apache
+        self.access_logger.info('%s - %s [%s] "%s" %s %s "%s" "%s" %d',
+                                self.client_address[0],
+                                user.cards[0] if user and user.cards else '-',
+                                datetime.now().astimezone().strftime('%d/%b/%Y:%H:%M:%S %z'),
+                                self.requestline,
+                                self.__status,
+                                self.__sent,
+                                self.headers['Referer'] or '-' if self.headers else '-',
+                                self.headers['User-Agent'] or '-' if self.headers else '-',
+                                int(elapsed * 1000000))
+
+    def end_headers(self):
+        for keyword, value in self.__pending_headers:
+            self.send_header(keyword, value)
+        self.__pending_headers = []
+        BaseHTTPRequestHandler.end_headers(self)
+
     def do_GET(self):
+        self.__dispatch()
+
+    def do_POST(self):
+        self.__dispatch()
+
+    def __dispatch(self):
+        self.__is_user_loaded = False
+        self.__pending_headers = []
         url = urlparse(self.path).path
-        for key in self.routes.keys():
-            if fnmatch(url, key):
-                self.routes[key]()
-                return
-        for include in self.includes:
-            if str(url).startswith(include):
-                filename = self.directories['include'] + url
-                self.send_file(filename)
-                return
+        route = self.router.resolve(self.command, url)
+        if route:
+            self.router.dispatch(self, route)
+            return
+        if self.headers['Content-Length']:
+            # Непрочитанное тело запроса нарушит разбор следующего запроса в соединении
+            self.close_connection = True
+        methods = self.router.get_methods(url)
+        if methods:
+            self.__pending_headers.append(('Allow', ', '.join(methods)))
+            self.generate_error("Метод не поддерживается", code=405)
+            return
         self.generate_not_found()
 
-    def do_AUTHHEAD(self):
-        self.send_response(401)
-        self.send_header('WWW-Authenticate', 'Basic realm="Access to RFID server"')
-        self.send_header('Content-type', 'text/html')
-        self.end_headers()
+    def redirect_home(self):
+        self.redirect('/home')
+
+    def request_authentication(self):
+        self.__pending_headers.append(('WWW-Authenticate', 'Basic realm="Access to RFID server"'))
 
     def authorize(self, request=True):
-        if not self.headers['Authorization']:
-            if request:
-                self.do_AUTHHEAD()
-                self.generate_error("Авторизация прервана", code=0)
-            return False
-        else:
-            user = self.get_user()
-            if user:
-                if not user.active:
-                    if request:
-                        self.generate_error("Пользователь был заблокирован", code=0)
-                    return False
-                return True
-            else:
+        user = self.get_user()
+        if user:
+            if not user.active:
                 if request:
-                    self.do_AUTHHEAD()
-                    self.generate_error("Неверный логин или пароль", code=0)
+                    self.generate_error("Пользователь был заблокирован", code=403)
                 return False
+            return True
+        if request:
+            self.request_authentication()
+            if not self.headers['Authorization']:
+                self.generate_error("Авторизация прервана", code=401)
+            else:
+                self.generate_error("Неверный логин или пароль", code=401)
+        return False
 
     def is_authorized(self):
         return self.authorize(request=False)
 
     def get_user(self):
+        if not self.__is_user_loaded:
+            self.__user = self.__find_user()
+            self.__is_user_loaded = True
+        return self.__user
+
+    def __get_session_token(self):
+        try:
+            cookie = SimpleCookie(self.headers['Cookie'])
+        except CookieError:
+            return None
+        if SessionManager.COOKIE not in cookie:
+            return None
+        return cookie[SessionManager.COOKIE].value
+
+    def __find_user(self):
+        user = self.sessions.get(self.__get_session_token())
+        if user:
+            return user
+        user = self.__check_credentials()
+        if user and user.active:
+            cookie = '{}={}; Max-Age={}; Path=/; Secure; HttpOnly; SameSite=Strict'.format(
+                SessionManager.COOKIE,
+                self.sessions.create(user),
+                self.sessions.lifetime)
+            self.__pending_headers.append(('Set-Cookie', cookie))
+        return user
+
+    def __check_credentials(self):
         header = self.headers['Authorization']
+        if not header:
+            return None
         header = header[header.find(' '):]
-        users = self.db.get_all_users()
-        card, password = b64decode(bytes(header, 'utf-8')).decode('utf-8').split(':')
-        user = [x for x in users if card in x.cards and x.check_password(password)]
-        if len(user) == 0:
+        try:
+            card, password = b64decode(bytes(header, 'utf-8')).decode('utf-8').split(':', 1)
+        except ValueError:
+            return None
+        user = self.db.get_user(card)
+        if not user or not user.check_password(password):
             return None
-        return user[0]
+        return user
 
     def redirect(self, url):
         self.send_response(301)
         self.send_header("Location", url)
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
     def get_alerts(self):
@@ -129,82 +242,72 @@ class ServerHandler(BaseHTTPRequestHandler):
             out.append(pattern.format(alert['type'], text))
         return '\n'.join(out)
 
-    @staticmethod
-    def include_css(items):
-        out = []
-        pattern = '<link rel="stylesheet" href="/css/{}.css">'
-        for item in items:
-            out.append(pattern.format(item))
-        return ''.join(out)
-
-    @staticmethod
-    def include_js(items):
-        out = []
-        pattern = '<script src="/js/{}.js"></script>'
-        for item in items:
-            out.append(pattern.format(item))
-        return ''.join(out)
-
-    @staticmethod
-    def include_meta(items):
-        out = []
-        pattern = Template('<meta name="$name" content="$content">')
-        for item in items:
-            out.append(pattern.safe_substitute(item))
-        return ''.join(out)
-
     def generate(self, name, title, body=None, code=200):
-        template = self.directories['templates'] + name + '.html'
-        base = self.directories['templates'] + 'base' + '.html'
-        if not path.exists(template):
-            pass
-        with open(base) as base:
-            with open(template) as file:
-                html = Template(base.read())
-                content = file.read()
-                soup = BeautifulSoup(content)
-                comments = soup.findAll(text=lambda text: isinstance(text, Comment))
-                css = ''
-                js = ''
-                meta = ''
-                if comments:
-                    command = json.loads(comments[0].strip())
-                    if 'css' in command:
-                        css = self.include_css(command['css'])
-                    if 'js' in command:
-                        js = self.include_js(command['js'])
-                    if 'meta' in command:
-                        meta = self.include_meta(command['meta'])
-                    if 'in_develop' in command and not self.debug:
-                        self.generate_error("Страница находится в разработке")
-                        return
-                html = html.safe_substitute({
-                    'meta': meta,
-                    'css': css,
-                    'js': js,
-                    'alerts': self.get_alerts(),
-                    'header': title,
-                    'content': content
-                })
-                if body:
-                    html = Template(html).safe_substitute(body)
-                self.send_response(code)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                self.wfile.write(html.encode())
+        page = self.templates.get(name)
+        if page is None:
+            self.logger.error("Шаблон {} не найден".format(name))
+            self.send_error(500)
+            return
+        if page['in_develop'] and not self.debug:
+            self.generate_error("Страница находится в разработке")
+            return
+        values = dict(body) if body else {}
+        values['alerts'] = self.get_alerts()
+        values['header'] = title
+        html = page['template'].safe_substitute(values).encode()
+        self.send_response(code)
+        self.send_header('Content-type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(html)))
+        self.end_headers()
+        self.wfile.write(html)
+
+    def send_json(self, data, code=200):
+        content = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
 
     def generate_error(self, message, code=200):
         self.generate('error', 'Ошибка сервера', {'message': message}, code)
 
     def generate_logs(self):
-        if not path.exists(VisitsLogger.VISITS_LOG):
+        reader = LogReader(VisitsLogger.VISITS_LOG, VisitsLogger.DATE_FORMAT)
+        if not reader.exists():
             self.generate_error("Файл лога не найден")
             return
-        with open(VisitsLogger.VISITS_LOG) as log:
-            events = [x.strip() for x in log.readlines()[-20:]]
-            items = ''.join(['<li class="list-group-item">{}</li>'.format(x) for x in events
-                             if not x.startswith('----')])
-            self.generate('logs', "Лог посещений", {'items': items})
+        query = parse_qs(urlparse(self.path).query)
+        try:
+            since = datetime.strptime(query['since'][0], '%Y-%m-%d') if 'since' in query else None
+            until = datetime.strptime(query['until'][0], '%Y-%m-%d') if 'until' in query else None
+            # Конечная дата включает весь день
+            page = reader.page(self.LOGS_PAGE,
+                               query['before'][0] if 'before' in query else None,
+                               query['after'][0] if 'after' in query else None,
+                               since,
+                               until + timedelta(days=1, seconds=-1) if until else None)
+        except ValueError:
+            self.generate_error("Неверные параметры запроса", code=400)
+            return
+        dates = {x: query[x][0] for x in ['since', 'until'] if x in query}
+        items = ''.join(['<li class="list-group-item">{}</li>'.format(x) for x in page['items']])
+        if not items:
+            items = '<li class="list-group-item">Событий не найдено</li>'
+        self.generate('logs', "Лог посещений", {
+            'items': items,
+            'count': len(page['items']),
+            'since': dates.get('since', ''),
+            'until': dates.get('until', ''),
+            'older': self.__get_page_link(dict(dates, before=page['older'])) if page['older'] else '#',
+            'older_state': '' if page['older'] else 'disabled',
+            'newer': self.__get_page_link(dict(dates, after=page['newer'])) if page['newer'] else '#',
+            'newer_state': '' if page['newer'] else 'disabled'
+        })
+
+    @staticmethod
+    def __get_page_link(query):
+        return '/logs?' + urlencode(query)
 
     def generate_camera(self):
         if not self.stream_port:
@@ -216,13 +319,47 @@ class ServerHandler(BaseHTTPRequestHandler):
     def generate_not_found(self):
         self.generate_error("Ресурс не найден", code=404)
 
+    def confirm_door(self):
+        if not self.authorize():
+            return
+        self.generate('secure/door-confirm', "Открыть дверь?")
+
     def generate_door(self):
+        # Дверь открывается только POST-запросом со своей страницы: чужой сайт не откроет ее ссылкой или формой
+        self.__discard_body()
+        if not self.__is_same_origin():
+            self.generate_error("Запрос отклонен", code=403)
+            return
         if not self.authorize():
             return
+        self.door.unlock(self.DOOR_DELAY)
         self.generate('secure/door', "Дверь была открыта")
-        self.serial.open()
-        sleep(2)
-        self.serial.standard()
+
+    def logout(self):
+        self.__discard_body()
+        if not self.__is_same_origin():
+            self.generate_error("Запрос отклонен", code=403)
+            return
+        self.sessions.revoke(self.__get_session_token())
+        self.__pending_headers.append(('Set-Cookie', '{}=; Max-Age=0; Path=/; Secure; HttpOnly; SameSite=Strict'.format(
+            SessionManager.COOKIE)))
+        self.generate('logout', "Выход")
+
+    def __discard_body(self):
+        try:
+            length = int(self.headers['Content-Length'] or 0)
+        except ValueError:
+            self.close_connection = True
+            return
+        if length > 0:
+            self.rfile.read(length)
+
+    def __is_same_origin(self):
+        # Клиенты без Origin и Referer (curl, скрипты) не подвержены межсайтовым запросам
+        source = self.headers['Origin'] or self.headers['Referer']
+        if not source:
+            return True
+        return urlparse(source).netloc == self.headers['Host']
 
     def generate_control_panel(self):
         if not self.authorize():
@@ -244,20 +381,85 @@ class ServerHandler(BaseHTTPRequestHandler):
         actions = ''.join([pattern.format('/control/' + choice['action'], choice['text']) for choice in choices])
         self.generate('secure/panel', "Панель управления", {'actions': actions})
 
-    def send_file(self, filename):
-        if path.exists(filename) and path.isfile(filename):
-            extension = path.splitext(filename)[1]
-            if extension in self.mimes:
-                mime = self.mimes[extension]
-            else:
-                mime = Magic(mime=True).from_file(filename)
-            self.send_response(200)
-            self.send_header('Content-type', mime)
+    def send_static(self):
+        self.send_file(urlparse(self.path).path)
+
+    def send_file(self, url):
+        entry = self.static.get(url)
+        if not entry:
+            self.generate_not_found()
+            return
+        if self.static.is_not_modified(entry, self.headers):
+            self.send_response(304)
+            self.__send_cache_headers(entry)
             self.end_headers()
-            with open(filename, 'rb') as file:
-                self.wfile.write(file.read())
-        else:
+            return
+        file_range = self.static.get_range(entry, self.headers)
+        if file_range is False:
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */{}'.format(entry['size']))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        offset, length = file_range if file_range else (0, entry['size'])
+        self.send_response(206 if file_range else 200)
+        self.send_header('Content-type', entry['mime'])
+        self.send_header('Content-Length', str(length))
+        if file_range:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(offset, offset + length - 1, entry['size']))
+        self.__send_cache_headers(entry)
+        self.end_headers()
+        with open(entry['path'], 'rb') as file:
+            self.__send_body(file, offset, length)
+
+    def send_bundle(self):
+        bundle = self.templates.bundler.get(urlparse(self.path).path) if self.templates.bundler else None
+        if not bundle:
             self.generate_not_found()
+            return
+        if self.headers['If-None-Match'] == bundle['etag']:
+            self.send_response(304)
+            self.__send_bundle_headers(bundle)
+            self.end_headers()
+            return
+        encoding = AssetBundler.choose_encoding(bundle, self.headers['Accept-Encoding'])
+        content = bundle[encoding]
+        self.send_response(200)
+        self.send_header('Content-type', bundle['mime'])
+        self.send_header('Content-Length', str(len(content)))
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.__send_bundle_headers(bundle)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def __send_bundle_headers(self, bundle):
+        # Адрес пакета содержит хэш содержимого, поэтому пакет можно кэшировать навсегда
+        self.send_header('ETag', bundle['etag'])
+        self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
+        self.send_header('Vary', 'Accept-Encoding')
+
+    def __send_cache_headers(self, entry):
+        self.send_header('ETag', entry['etag'])
+        self.send_header('Last-Modified', entry['last_modified'])
+        self.send_header('Cache-Control', 'public, max-age={}'.format(StaticFiles.MAX_AGE))
+        self.send_header('Accept-Ranges', 'bytes')
+
+    def __send_body(self, file, offset, length):
+        self.wfile.flush()
+        if hasattr(self.connection, 'sendfile'):
+            # Файл передается ядром (или блоками для TLS) без чтения целиком в память
+            self.connection.sendfile(file, offset, length)
+            return
+        file.seek(offset)
+        while length > 0:
+            block = file.read(min(length, 64 * 1024))
+            if not block:
+                # Файл укоротили во время отправки: клиент не дождется обещанной длины
+                self.close_connection = True
+                break
+            self.wfile.write(block)
+            length -= len(block)
 
     def generate_home(self):
         if self.is_authorized():
@@ -267,11 +469,10 @@ class ServerHandler(BaseHTTPRequestHandler):
         self.generate('home', "RFID сервер", {'name': name})
 
     def log_message(self, pattern, *args):
-        client = list(self.request.getpeername())[0]
-        time = datetime.now().strftime('%a, %d %B %Y, %H:%M:%S')
-        message = "{} from {} :: {}".format(time, client, pattern % args)
-        with open(self.REQUESTS_LOG, 'a') as log:
-            log.write(message + '\n')
+        self.access_logger.warning('%s - - [%s] %s',
+                                   self.client_address[0],
+                                   datetime.now().astimezone().strftime('%d/%b/%Y:%H:%M:%S %z'),
+                                   pattern % args)
 
     def control_add_user(self):
         if not self.authorize():
@@ -287,30 +488,18 @@ class ServerHandler(BaseHTTPRequestHandler):
         choices = ''.join([pattern.format(x) for x in access])
         self.generate('secure/control/add-user', "Добавление пользователя", {'access': choices})
 
-    def handle_ajax(self):
-        url = urlparse(self.path).path.split('/')[-1:][0]
-        routes = {
-            'test': lambda: self.wfile.write(json.dumps({'success': 'OK'}).encode()),
-            'validate': lambda: self.validate_card()
-        }
-        if url in routes:
-            routes[url]()
-        else:
-            self.wfile.write(json.dumps({'error': 'not_found'}).encode())
+    def ajax_test(self):
+        self.send_json({'success': 'OK'})
+
+    def ajax_not_found(self):
+        self.send_json({'error': 'not_found'}, code=404)
 
     def validate_card(self):
-        card = parse_qs(urlparse(self.path).query)['card'][0]
-        self.wfile.write(json.dumps({
+        cards = parse_qs(urlparse(self.path).query).get('card')
+        if not cards:
+            self.send_json({'error': 'no_card'}, code=400)
+            return
+        self.send_json({
             'success': True,
-            'is_valid': not self.db.get_user(card)
-        }).encode())
-
-    def handle_control(self):
-        url = urlparse(self.path).path.split('/')[-1:][0]
-        routes = {
-            'add-user': lambda: self.control_add_user()
-        }
-        if url in routes:
-            routes[url]()
-        else:
-            self.generate_not_found()
\ No newline at end of file
+            'is_valid': not self.db.get_user(cards[0])
+        })
\ No newline at end of file
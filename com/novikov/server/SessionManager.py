@@ -0,0 +1,113 @@
+from base64 import urlsafe_b64encode
+import hmac
+from hashlib import sha256
+import logging
+import os
+from threading import Lock
+from time import time
+
+from com.novikov.rfid.UserModel import UserModel
+
+
+__author__ = 'Ilia Novikov'
+
+
+class SessionManager:
+    COOKIE = 'session'
+    # Изменения пользователей другими процессами отзывают сессии только через кэш карт (потоки изменений
+    # или опрос). Если кэш выключен, заблокированный пользователь сохраняет сессию не дольше LIFETIME
+    LIFETIME = 30 * 60
+
+    def __init__(self, lifetime=LIFETIME):
+        self.logger = logging.getLogger('rfid.server')
+        self.lifetime = int(lifetime)
+        # Ключ живет только в памяти процесса: после перезапуска все сессии недействительны
+        self.__secret = os.urandom(32)
+        self.__sessions = {}
+        self.__cards = {}
+        self.__lock = Lock()
+
+    def __sign(self, payload):
+        digest = hmac.new(self.__secret, payload.encode(), sha256).digest()
+        return urlsafe_b64encode(digest).decode().rstrip('=')
+
+    @staticmethod
+    def __stamp(user: UserModel):
+        model = user.get_model()
+        return model[UserModel.HASH], model[UserModel.ACTIVE]
+
+    def create(self, user: UserModel):
+        session_id = urlsafe_b64encode(os.urandom(18)).decode()
+        expires = int(time()) + self.lifetime
+        with self.__lock:
+            self.__purge()
+            self.__sessions[session_id] = {
+                'user': user,
+                'expires': expires,
+                'stamp': self.__stamp(user)
+            }
+            for card_id in user.cards:
+                self.__cards.setdefault(card_id, set()).add(session_id)
+        payload = '{}.{}'.format(session_id, expires)
+        return '{}.{}'.format(payload, self.__sign(payload))
+
+    def get(self, token):
+        if not token:
+            return None
+        try:
+            session_id, expires, signature = token.split('.')
+            expires = int(expires)
+        except ValueError:
+            return None
+        if not hmac.compare_digest(signature, self.__sign('{}.{}'.format(session_id, expires))):
+            return None
+        if expires <= time():
+            return None
+        with self.__lock:
+            session = self.__sessions.get(session_id)
+            if not session or session['expires'] != expires:
+                return None
+            return session['user']
+
+    def revoke(self, token):
+        session_id = token.split('.')[0] if token else None
+        with self.__lock:
+            self.__remove(session_id)
+
+    def on_user_changed(self, cards, user):
+        with self.__lock:
+            if cards is None:
+                self.__sessions.clear()
+                self.__cards.clear()
+                return
+            sessions = set()
+            for card_id in cards:
+                sessions.update(self.__cards.get(card_id, ()))
+            for session_id in sessions:
+                session = self.__sessions.get(session_id)
+                if not session:
+                    continue
+                if user is None or not user.active or self.__stamp(user) != session['stamp']:
+                    self.logger.info("Сессия пользователя {} отозвана".format(session['user'].name))
+                    self.__remove(session_id)
+                else:
+                    session['user'] = user
+
+    def __remove(self, session_id):
+        session = self.__sessions.pop(session_id, None)
+        if not session:
+            return
+        for card_id in session['user'].cards:
+            sessions = self.__cards.get(card_id)
+            if sessions:
+                sessions.discard(session_id)
+                if not sessions:
+                    del self.__cards[card_id]
+
+    def __purge(self):
+        now = time()
+        for session_id in [x for x, y in self.__sessions.items() if y['expires'] <= now]:
+            self.__remove(session_id)
+
+    def __len__(self):
+        return len(self.__sessions)
@@ -0,0 +1,136 @@
+from email.utils import formatdate, parsedate_to_datetime
+from hashlib import sha1
+import logging
+import os
+from threading import Lock
+
+from magic import Magic
+
+
+__author__ = 'Ilia Novikov'
+
+
+class StaticFiles:
+    PREFIXES = ['/css/', '/img/', '/fonts/', '/js/']
+    MIMES = {
+        '.js': 'application/javascript',
+        '.css': 'text/css',
+        '.html': 'text/html',
+        '.ico': 'image/x-icon',
+        '.jpg': 'image/jpeg',
+        '.png': 'image/png',
+        '.woff2': 'application/font-woff2',
+        '.woff': 'application/font-woff2',
+        '.ttf': 'application/octet-stream',
+        '.svg': 'image/svg+xml',
+        '.map': 'application/json'
+    }
+    MAX_AGE = 24 * 60 * 60
+    __BLOCK = 64 * 1024
+
+    def __init__(self, directory, prefixes=None):
+        self.logger = logging.getLogger('rfid.server')
+        self.directory = os.path.abspath(directory)
+        self.prefixes = prefixes if prefixes else self.PREFIXES
+        self.__manifest = {}
+        self.__magic = None
+        self.__lock = Lock()
+
+    def build(self):
+        manifest = {}
+        size = 0
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                filename = os.path.join(root, filename)
+                url = '/' + os.path.relpath(filename, self.directory).replace(os.sep, '/')
+                if not self.is_static(url):
+                    continue
+                manifest[url] = self.__describe(filename)
+                size += manifest[url]['size']
+        self.__manifest = manifest
+        self.logger.info("Статических файлов: {}, общий размер: {} байт".format(len(manifest), size))
+
+    def is_static(self, url):
+        return any(url.startswith(x) for x in self.prefixes)
+
+    def __get_mime(self, filename):
+        extension = os.path.splitext(filename)[1]
+        if extension in self.MIMES:
+            return self.MIMES[extension]
+        with self.__lock:
+            if self.__magic is None:
+                self.__magic = Magic(mime=True)
+            return self.__magic.from_file(filename)
+
+    def __describe(self, filename):
+        stat = os.stat(filename)
+        digest = sha1()
+        with open(filename, 'rb') as file:
+            for block in iter(lambda: file.read(self.__BLOCK), b''):
+                digest.update(block)
+        return {
+            'path': filename,
+            'mime': self.__get_mime(filename),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'etag': '"{}"'.format(digest.hexdigest()),
+            'last_modified': formatdate(stat.st_mtime, usegmt=True)
+        }
+
+    def get(self, url):
+        entry = self.__manifest.get(url)
+        if entry is not None:
+            # Измененный после запуска файл описывается заново: иначе ETag, длина и диапазоны устареют
+            try:
+                stat = os.stat(entry['path'])
+            except OSError:
+                self.__manifest.pop(url, None)
+                return None
+            if stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime']:
+                return entry
+            entry = self.__describe(entry['path'])
+            self.__manifest[url] = entry
+            return entry
+        # Файл, появившийся после запуска, описывается при первом запросе
+        filename = os.path.normpath(os.path.join(self.directory, url.lstrip('/')))
+        if not filename.startswith(self.directory + os.sep) or not os.path.isfile(filename):
+            return None
+        entry = self.__describe(filename)
+        self.__manifest[url] = entry
+        return entry
+
+    @staticmethod
+    def is_not_modified(entry, headers):
+        if headers['If-None-Match']:
+            return entry['etag'] in [x.strip() for x in headers['If-None-Match'].split(',')] \
+                or headers['If-None-Match'].strip() == '*'
+        if headers['If-Modified-Since']:
+            try:
+                since = parsedate_to_datetime(headers['If-Modified-Since']).timestamp()
+            except (TypeError, ValueError, IndexError):
+                return False
+            return entry['mtime'] // 10 ** 9 <= since
+        return False
+
+    @staticmethod
+    def get_range(entry, headers):
+        # Возвращает (начало, длина) для одного диапазона, None для всего файла
+        # или False для неудовлетворимого диапазона
+        header = headers['Range']
+        if not header or not header.startswith('bytes=') or ',' in header:
+            return None
+        if headers['If-Range'] and headers['If-Range'] != entry['etag']:
+            return None
+        size = entry['size']
+        start, _, end = header[len('bytes='):].strip().partition('-')
+        try:
+            if not start:
+                length = min(int(end), size)
+                return (size - length, length) if length > 0 else False
+            start = int(start)
+            end = min(int(end), size - 1) if end else size - 1
+        except ValueError:
+            return None
+        if start >= size or end < start:
+            return False
+        return start, end - start + 1
@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import re
+from string import Template
+from threading import Lock
+
+from com.novikov.server.AssetBundler import AssetBundler
+
+
+__author__ = 'Ilia Novikov'
+
+
+class TemplateCache:
+    BASE = 'base'
+    EXTENSION = '.html'
+    # Параметры страницы задаются JSON-комментарием в начале шаблона
+    __COMMENT = re.compile(r'<!--(.*?)-->', re.S)
+
+    def __init__(self, directory):
+        self.logger = logging.getLogger('rfid.server')
+        self.directory = directory
+        self.check_mtime = True
+        self.bundler = None
+        """ :type : AssetBundler """
+        self.__pages = {}
+        self.__lock = Lock()
+
+    @staticmethod
+    def include_css(items):
+        out = []
+        pattern = '<link rel="stylesheet" href="/css/{}.css">'
+        for item in items:
+            out.append(pattern.format(item))
+        return ''.join(out)
+
+    @staticmethod
+    def include_js(items):
+        out = []
+        pattern = '<script src="/js/{}.js"></script>'
+        for item in items:
+            out.append(pattern.format(item))
+        return ''.join(out)
+
+    @staticmethod
+    def include_meta(items):
+        out = []
+        pattern = Template('<meta name="$name" content="$content">')
+        for item in items:
+            out.append(pattern.safe_substitute(item))
+        return ''.join(out)
+
+    def __get_filename(self, name):
+        return os.path.join(self.directory, name + self.EXTENSION)
+
+    def __get_mtimes(self, name):
+        return os.stat(self.__get_filename(self.BASE)).st_mtime_ns, os.stat(self.__get_filename(name)).st_mtime_ns
+
+    def get(self, name):
+        page = self.__pages.get(name)
+        if page is not None and not self.check_mtime:
+            return page
+        try:
+            mtimes = self.__get_mtimes(name)
+        except OSError:
+            return None
+        if page is not None and page['mtimes'] == mtimes:
+            return page
+        with self.__lock:
+            page = self.__compile(name, mtimes)
+            self.__pages[name] = page
+        return page
+
+    def __parse(self, filename):
+        with open(filename) as file:
+            content = file.read()
+        comment = self.__COMMENT.search(content)
+        if not comment:
+            return content, {}
+        # Служебный комментарий не попадает в страницу
+        content = content[:comment.start()] + content[comment.end():].lstrip('\n')
+        return content, json.loads(comment.group(1).strip())
+
+    def __include(self, kind, items):
+        if not items:
+            return ''
+        if self.bundler:
+            url = self.bundler.bundle(kind, items)
+            return {
+                'css': '<link rel="stylesheet" href="{}">',
+                'js': '<script src="{}"></script>'
+            }[kind].format(url)
+        return {'css': self.include_css, 'js': self.include_js}[kind](items)
+
+    def __compile(self, name, mtimes):
+        base, defaults = self.__parse(self.__get_filename(self.BASE))
+        content, command = self.__parse(self.__get_filename(name))
+        # Общие стили и скрипты из base.html подключаются раньше стилей и скриптов страницы
+        html = Template(base).safe_substitute({
+            'meta': self.include_meta(defaults.get('meta', []) + command.get('meta', [])),
+            'css': self.__include('css', defaults.get('css', []) + command.get('css', [])),
+            'js': self.__include('js', defaults.get('js', []) + command.get('js', [])),
+            'content': content
+        })
+        return {
+            'template': Template(html),
+            'command': command,
+            'in_develop': 'in_develop' in command,
+            'mtimes': mtimes
+        }
+
+    def preload(self):
+        count = 0
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                name, extension = os.path.splitext(os.path.relpath(os.path.join(root, filename), self.directory))
+                if extension != self.EXTENSION or name == self.BASE:
+                    continue
+                if self.get(name.replace(os.sep, '/')):
+                    count += 1
+        # После предзагрузки шаблоны не проверяются на изменение
+        self.check_mtime = False
+        self.logger.info("Предзагружено шаблонов: {}".format(count))
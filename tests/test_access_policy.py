@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+from itertools import product
+import unittest
+
+from com.novikov.rfid.AccessLevel import AccessLevel
+from com.novikov.rfid.AccessPolicy import AccessPolicy
+from com.novikov.rfid.DoorMode import DoorMode
+from com.novikov.rfid.UserModel import UserModel
+
+
+__author__ = 'Ilia Novikov'
+
+
+# 2026-03-02 - понедельник
+NOW = datetime(2026, 3, 2, 12, 0)
+MODES = [DoorMode.STANDARD, DoorMode.LOCK, DoorMode.MAINTENANCE]
+
+
+def make_user(access=AccessLevel.common, active=True, expire=NOW + timedelta(days=1), schedule=None):
+    return UserModel(cards=['a'], name='user', access=access, expire=expire, active=active, schedule=schedule)
+
+
+class AccessPolicyTest(unittest.TestCase):
+    def setUp(self):
+        self.policy = AccessPolicy(schedules={AccessLevel.guest: 'weekdays 09:00-18:00'}, holidays=['2026-03-03'])
+
+    def reason(self, user, mode=DoorMode.STANDARD, now=NOW):
+        return self.policy.decide(user, now, mode).reason
+
+    def test_unknown_inactive_and_expired(self):
+        self.assertEqual(self.reason(None), AccessPolicy.UNKNOWN_CARD)
+        self.assertEqual(self.reason(make_user(active=False)), AccessPolicy.INACTIVE)
+        self.assertEqual(self.reason(make_user(expire=NOW)), AccessPolicy.EXPIRED)
+        self.assertEqual(self.reason(make_user()), AccessPolicy.GRANTED)
+
+    def test_minimum_access_per_mode(self):
+        self.assertEqual(self.reason(make_user(AccessLevel.guest)), AccessPolicy.GRANTED)
+        self.assertEqual(self.reason(make_user(AccessLevel.common), DoorMode.LOCK), AccessPolicy.LOW_ACCESS)
+        self.assertEqual(self.reason(make_user(AccessLevel.privileged), DoorMode.LOCK), AccessPolicy.GRANTED)
+
+    def test_maintenance_mode_is_closed(self):
+        for level in AccessLevel:
+            self.assertEqual(self.reason(make_user(level), DoorMode.MAINTENANCE), AccessPolicy.DOOR_CLOSED)
+        decision = self.policy.decide(make_user(AccessLevel.developer), NOW, DoorMode.MAINTENANCE)
+        self.assertFalse(decision.allowed)
+
+    def test_custom_minimum_access(self):
+        policy = AccessPolicy(minimum_access={DoorMode.LOCK: AccessLevel.developer})
+        self.assertEqual(policy.decide(make_user(), NOW, DoorMode.STANDARD).reason, AccessPolicy.DOOR_CLOSED)
+        self.assertEqual(policy.decide(make_user(AccessLevel.developer), NOW, DoorMode.LOCK).reason,
+                         AccessPolicy.GRANTED)
+
+    def test_level_schedule(self):
+        guest = make_user(AccessLevel.guest, expire=NOW + timedelta(days=7))
+        self.assertEqual(self.reason(guest, now=NOW.replace(hour=20)), AccessPolicy.OFF_SCHEDULE)
+        # 2026-03-03 - праздник
+        self.assertEqual(self.reason(guest, now=NOW + timedelta(days=1)), AccessPolicy.OFF_SCHEDULE)
+        self.assertEqual(self.reason(make_user(), now=NOW.replace(hour=20)), AccessPolicy.GRANTED)
+
+    def test_personal_schedule_replaces_level_schedule(self):
+        guest = make_user(AccessLevel.guest, schedule='daily 18:00-22:00')
+        self.assertEqual(self.reason(guest, now=NOW.replace(hour=20)), AccessPolicy.GRANTED)
+        self.assertEqual(self.reason(guest), AccessPolicy.OFF_SCHEDULE)
+
+    def test_broken_personal_schedule_denies(self):
+        self.assertEqual(self.reason(make_user(schedule='sometimes')), AccessPolicy.OFF_SCHEDULE)
+        self.assertIs(self.policy.get_schedule('sometimes'), self.policy.get_schedule('sometimes'))
+
+    def test_broken_level_schedule_stops_start(self):
+        with self.assertRaises(ValueError):
+            AccessPolicy(schedules={AccessLevel.guest: 'sometimes'})
+
+    def test_low_access_is_reported_before_schedule(self):
+        guest = make_user(AccessLevel.guest)
+        self.assertEqual(self.reason(guest, DoorMode.LOCK, NOW.replace(hour=20)), AccessPolicy.LOW_ACCESS)
+
+    def test_batch_matches_single_decisions(self):
+        users = [None]
+        for level, active, expire, schedule in product(AccessLevel, [True, False], [NOW, NOW + timedelta(days=7)],
+                                                       [None, 'weekdays 10:00-14:00', 'sat never', 'broken']):
+            users.append(make_user(level, active, expire, schedule))
+        moments = [NOW, NOW.replace(hour=8), NOW.replace(hour=20), NOW + timedelta(days=1), NOW + timedelta(days=5)]
+        for mode in MODES:
+            with self.subTest(mode=mode):
+                taps = [(user, now) for user in users for now in moments]
+                expected = [self.policy.decide(user, now, mode) for user, now in taps]
+                batch = self.policy.decide_batch([self.policy.get_tap(user, now) for user, now in taps], mode)
+                self.assertEqual(batch, expected)
+
+    def test_empty_batch(self):
+        self.assertEqual(self.policy.decide_batch([], DoorMode.STANDARD), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+import os
+import shutil
+import tempfile
+import unittest
+
+from com.novikov.rfid.AccessLevel import AccessLevel
+from com.novikov.rfid.EventStore import EventStore
+from com.novikov.rfid.LogWriter import LogWriter
+from com.novikov.rfid.UserModel import UserModel
+
+
+__author__ = 'Ilia Novikov'
+
+
+START = datetime(2026, 3, 2, 8, 0)
+
+
+class EventStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.writer = LogWriter(durability=LogWriter.DURABILITY_NEVER)
+        self.store = self.create_store()
+        self.user = UserModel(cards=['a'], name='Иван', access=AccessLevel.common)
+
+    def tearDown(self):
+        self.writer.close()
+        shutil.rmtree(self.directory)
+
+    def create_store(self):
+        store = EventStore(self.directory, self.writer)
+        # Мелкий шаг индекса, чтобы поиск по времени проходил через несколько точек индекса
+        store.INDEX_STEP = 256
+        return store
+
+    def record(self, minutes, outcome=EventStore.VISIT, card_id='a'):
+        timestamp = (START + timedelta(minutes=minutes)).timestamp()
+        return self.store.record(outcome, self.user, card_id, 'reader', timestamp=timestamp)
+
+    @staticmethod
+    def minutes(events):
+        return [int((datetime.fromtimestamp(x[EventStore.TIMESTAMP]) - START).total_seconds() // 60) for x in events]
+
+    def test_event_fields(self):
+        event = self.record(0)
+        self.assertEqual(self.store.query(), [event])
+        self.assertEqual(event[EventStore.USER], 'Иван')
+        self.assertEqual(event[EventStore.ACCESS], str(AccessLevel.common))
+        self.assertEqual(event[EventStore.READER], 'reader')
+
+    def test_filters(self):
+        self.record(0)
+        self.record(1, EventStore.WRONG_ACCESS)
+        self.record(2, EventStore.EXPIRED, card_id='b')
+        self.record(3, card_id='b')
+        self.assertEqual(self.minutes(self.store.query(card_id='b')), [2, 3])
+        self.assertEqual(self.minutes(self.store.query(outcome=EventStore.VISIT)), [0, 3])
+        self.assertEqual(self.minutes(self.store.query(outcome=EventStore.DENIALS)), [1, 2])
+        self.assertEqual(self.minutes(self.store.query(card_id='b', outcome=EventStore.DENIALS)), [2])
+        self.assertEqual(self.minutes(self.store.query(limit=3)), [0, 1, 2])
+
+    def test_time_interval_uses_index(self):
+        for minute in range(100):
+            self.record(minute)
+        self.writer.flush()
+        self.assertTrue(os.path.getsize(os.path.join(self.directory, '2026-03-02.idx')) > 16)
+        since = START + timedelta(minutes=40)
+        until = START + timedelta(minutes=45)
+        self.assertEqual(self.minutes(self.store.query(since=since, until=until)), list(range(40, 46)))
+        self.assertEqual(self.minutes(self.store.query(since=START + timedelta(minutes=98))), [98, 99])
+
+    def test_days_are_separate_segments(self):
+        self.record(0)
+        self.record(24 * 60)
+        self.record(2 * 24 * 60)
+        self.writer.flush()
+        self.assertEqual(self.store.get_segments(), ['2026-03-02', '2026-03-03', '2026-03-04'])
+        since = START + timedelta(days=1)
+        self.assertEqual(self.minutes(self.store.query(since=since, until=since)), [24 * 60])
+
+    def test_restart_continues_segment(self):
+        for minute in range(20):
+            self.record(minute)
+        self.writer.flush()
+        self.store = self.create_store()
+        for minute in range(20, 40):
+            self.record(minute)
+        since = START + timedelta(minutes=25)
+        self.assertEqual(self.minutes(self.store.query(since=since, until=since)), [25])
+        self.assertEqual(self.minutes(self.store.query()), list(range(40)))
+
+    def test_broken_lines_are_skipped(self):
+        self.record(0)
+        self.writer.flush()
+        with open(os.path.join(self.directory, '2026-03-02.jsonl'), 'ab') as file:
+            file.write(b'{"broken\n')
+        self.store = self.create_store()
+        self.record(1)
+        self.assertEqual(self.minutes(self.store.query()), [0, 1])
+
+    def test_denials(self):
+        self.store.record(EventStore.WRONG_ID, card_id='x')
+        self.store.record(EventStore.DOOR_CLOSED, self.user, 'a')
+        self.store.record(EventStore.VISIT, self.user, 'a')
+        self.assertEqual([x[EventStore.OUTCOME] for x in self.store.get_denials('a')], [EventStore.DOOR_CLOSED])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta
+import os
+import shutil
+import tempfile
+import unittest
+
+from com.novikov.rfid.LogReader import LogReader
+from com.novikov.rfid.LogRotator import LogRotator
+
+
+__author__ = 'Ilia Novikov'
+
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+START = datetime(2026, 1, 1)
+
+
+def make_line(number):
+    return '{}: Событие {}\n'.format((START + timedelta(minutes=number)).strftime(DATE_FORMAT), number)
+
+
+class LogReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'visits.log')
+        self.reader = LogReader(self.filename, DATE_FORMAT)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, numbers, separator=False):
+        with open(self.filename, 'a', encoding='utf-8') as file:
+            if separator:
+                file.write(LogReader.SEPARATOR + '\n')
+            for number in numbers:
+                file.write(make_line(number))
+
+    def write_segments(self, *groups):
+        # Каждая группа, кроме последней, уходит в сжатый сегмент, время изменения - время последней записи
+        rotator = LogRotator(retention=len(groups))
+        for index, numbers in enumerate(groups):
+            self.write(numbers)
+            if index + 1 < len(groups):
+                rotator.rotate(self.filename)
+        for number in LogRotator.get_segments(self.filename):
+            last = groups[len(groups) - 1 - number][-1]
+            stamp = (START + timedelta(minutes=last)).timestamp()
+            os.utime(LogRotator.get_segment_name(self.filename, number), (stamp, stamp))
+        stamp = (START + timedelta(minutes=groups[-1][-1])).timestamp()
+        os.utime(self.filename, (stamp, stamp))
+
+    @staticmethod
+    def numbers(page):
+        return [int(x.rsplit(' ', 1)[1]) for x in page['items']]
+
+    def test_missing_log(self):
+        self.assertFalse(self.reader.exists())
+        self.assertEqual(self.reader.page(), {'items': [], 'older': None, 'newer': None})
+
+    def test_first_page_is_newest(self):
+        self.write(range(10), separator=True)
+        page = self.reader.page(limit=3)
+        self.assertEqual(self.numbers(page), [7, 8, 9])
+        self.assertIsNotNone(page['older'])
+        self.assertIsNone(page['newer'])
+
+    def test_paging_back_and_forth(self):
+        self.write(range(10))
+        first = self.reader.page(limit=4)
+        second = self.reader.page(limit=4, before=first['older'])
+        third = self.reader.page(limit=4, before=second['older'])
+        self.assertEqual(self.numbers(second), [2, 3, 4, 5])
+        self.assertEqual(self.numbers(third), [0, 1])
+        self.assertIsNone(third['older'])
+        forward = self.reader.page(limit=4, after=second['newer'])
+        self.assertEqual(self.numbers(forward), [6, 7, 8, 9])
+        self.assertIsNone(forward['newer'])
+
+    def test_separators_are_skipped(self):
+        self.write(range(3))
+        self.write(range(3, 5), separator=True)
+        self.assertEqual(self.numbers(self.reader.page(limit=10)), [0, 1, 2, 3, 4])
+
+    def test_cursor_inside_line_is_aligned(self):
+        self.write(range(5))
+        offset = len(make_line(0).encode()) * 2 + 5
+        page = self.reader.page(limit=10, before=LogReader.format_cursor(0, offset))
+        self.assertEqual(self.numbers(page), [0, 1, 2])
+        page = self.reader.page(limit=10, after=LogReader.format_cursor(0, offset))
+        self.assertEqual(self.numbers(page), [3, 4])
+
+    def test_paging_across_rotated_segments(self):
+        self.write_segments(range(0, 10), range(10, 20), range(20, 30))
+        self.assertEqual(LogRotator.get_segments(self.filename), [1, 2])
+        collected = []
+        page = self.reader.page(limit=7)
+        while True:
+            collected = self.numbers(page) + collected
+            if not page['older']:
+                break
+            page = self.reader.page(limit=7, before=page['older'])
+        self.assertEqual(collected, list(range(30)))
+        collected = []
+        page = self.reader.page(limit=7, after=LogReader.format_cursor(2, 0))
+        while True:
+            collected.extend(self.numbers(page))
+            if not page['newer']:
+                break
+            page = self.reader.page(limit=7, after=page['newer'])
+        self.assertEqual(collected, list(range(30)))
+
+    def test_page_spanning_segment_boundary(self):
+        self.write_segments(range(0, 10), range(10, 12))
+        page = self.reader.page(limit=5)
+        self.assertEqual(self.numbers(page), [7, 8, 9, 10, 11])
+        self.assertEqual(LogReader.parse_cursor(page['older'])[0], 1)
+
+    def test_cursor_of_removed_segment(self):
+        # Сегмент курсора удален ротацией: старее ничего нет, вперед чтение идет с самого старого сегмента
+        self.write_segments(range(0, 5), range(5, 10))
+        page = self.reader.page(limit=3, before=LogReader.format_cursor(4, 100))
+        self.assertEqual(page['items'], [])
+        self.assertIsNone(page['older'])
+        self.assertEqual(self.numbers(self.reader.page(limit=3, after=page['newer'])), [0, 1, 2])
+        page = self.reader.page(limit=3, after=LogReader.format_cursor(4, 100))
+        self.assertEqual(self.numbers(page), [0, 1, 2])
+
+    def test_date_interval(self):
+        self.write(range(60))
+        since = START + timedelta(minutes=10)
+        until = START + timedelta(minutes=19, seconds=30)
+        page = self.reader.page(limit=100, since=since, until=until)
+        self.assertEqual(self.numbers(page), list(range(10, 20)))
+        page = self.reader.page(limit=4, since=since, until=until)
+        self.assertEqual(self.numbers(page), [16, 17, 18, 19])
+        page = self.reader.page(limit=100, since=since, until=until, before=page['older'])
+        self.assertEqual(self.numbers(page), list(range(10, 16)))
+        self.assertIsNone(page['older'])
+
+    def test_date_interval_skips_segments(self):
+        self.write_segments(range(0, 10), range(10, 20), range(20, 30))
+        page = self.reader.page(limit=100, since=START + timedelta(minutes=12), until=START + timedelta(minutes=14))
+        self.assertEqual(self.numbers(page), [12, 13, 14])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+
+from com.novikov.server.Router import Router
+
+try:
+    from com.novikov.server.ServerHandler import ServerHandler
+except ImportError:
+    ServerHandler = None
+
+
+__author__ = 'Ilia Novikov'
+
+
+ROUTES = [
+    ('GET', '/', 'home'),
+    ('GET', '/door', 'confirm'),
+    ('POST', '/door', 'open'),
+    ('GET', '/control', 'panel'),
+    ('GET', '/control/*', 'panel_not_found'),
+    ('GET', '/control/users/*', 'users'),
+    ('POST', '/control/users/*', 'save_user'),
+    ('GET', '/*', 'static')
+]
+
+
+class Handler:
+    def __init__(self):
+        self.calls = []
+
+    def home(self):
+        self.calls.append('home')
+
+    def fail(self):
+        raise ValueError()
+
+
+class RouterTest(unittest.TestCase):
+    def setUp(self):
+        self.router = Router(ROUTES)
+
+    def resolve(self, method, path):
+        route = self.router.resolve(method, path)
+        return route['action'] if route else None
+
+    def test_exact_routes(self):
+        self.assertEqual(self.resolve('GET', '/'), 'home')
+        self.assertEqual(self.resolve('GET', '/door'), 'confirm')
+        self.assertEqual(self.resolve('POST', '/door'), 'open')
+        self.assertEqual(self.resolve('GET', '/control'), 'panel')
+
+    def test_exact_route_wins_over_prefix(self):
+        self.assertEqual(self.resolve('GET', '/control'), 'panel')
+        self.assertEqual(self.resolve('GET', '/control/'), 'panel_not_found')
+
+    def test_longest_prefix_wins(self):
+        self.assertEqual(self.resolve('GET', '/control/users/1'), 'users')
+        self.assertEqual(self.resolve('GET', '/control/other'), 'panel_not_found')
+        self.assertEqual(self.resolve('GET', '/css/main.css'), 'static')
+
+    def test_prefix_respects_method(self):
+        self.assertEqual(self.resolve('POST', '/control/users/1'), 'save_user')
+        self.assertIsNone(self.resolve('POST', '/control/other'))
+        self.assertIsNone(self.resolve('DELETE', '/door'))
+
+    def test_methods_for_not_allowed_response(self):
+        self.assertEqual(self.router.get_methods('/door'), ['GET', 'POST'])
+        self.assertEqual(self.router.get_methods('/control/users/1'), ['GET', 'POST'])
+        self.assertEqual(self.router.get_methods('/control/other'), ['GET'])
+        self.assertEqual(Router([('POST', '/logout', 'logout')]).get_methods('/missing'), [])
+
+    def test_dispatch_collects_stats(self):
+        router = Router([('GET', '/', 'home'), ('GET', '/fail', 'fail'), ('GET', '/idle', 'home')])
+        handler = Handler()
+        router.dispatch(handler, router.resolve('GET', '/'))
+        router.dispatch(handler, router.resolve('GET', '/'))
+        with self.assertRaises(ValueError):
+            router.dispatch(handler, router.resolve('GET', '/fail'))
+        self.assertEqual(handler.calls, ['home', 'home'])
+        stats = [(x['pattern'], x['count'], x['errors']) for x in router.get_stats()]
+        self.assertEqual(stats, [('/', 2, 0), ('/fail', 1, 1)])
+
+    @unittest.skipIf(ServerHandler is None, "нужны зависимости ServerHandler")
+    def test_server_routes_have_handlers(self):
+        for method, pattern, action in ServerHandler.ROUTES:
+            with self.subTest(pattern=pattern):
+                self.assertTrue(callable(getattr(ServerHandler, action, None)))
+
+
+if __name__ == '__main__':
+    unittest.main()
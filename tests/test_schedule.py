@@ -0,0 +1,103 @@
+from datetime import datetime
+import unittest
+
+from com.novikov.rfid.Schedule import Schedule
+
+
+__author__ = 'Ilia Novikov'
+
+
+# 2026-03-02 - понедельник
+MONDAY = datetime(2026, 3, 2)
+
+
+def at(day, hour, minute=0):
+    return MONDAY.replace(day=MONDAY.day + day, hour=hour, minute=minute)
+
+
+class ScheduleTest(unittest.TestCase):
+    def test_always_and_never(self):
+        always = Schedule('always')
+        never = Schedule(' NEVER ')
+        empty = Schedule('')
+        for index in [0, Schedule.DAY_MINUTES * 3 + 17, Schedule.MINUTES - 1]:
+            self.assertTrue(always.allows(index))
+            self.assertFalse(never.allows(index))
+            self.assertFalse(empty.allows(index))
+
+    def test_interval_end_is_excluded(self):
+        schedule = Schedule('mon 09:00-18:00')
+        self.assertFalse(schedule.is_open(at(0, 8, 59)))
+        self.assertTrue(schedule.is_open(at(0, 9)))
+        self.assertTrue(schedule.is_open(at(0, 17, 59)))
+        self.assertFalse(schedule.is_open(at(0, 18)))
+        self.assertFalse(schedule.is_open(at(1, 10)))
+
+    def test_aliases(self):
+        weekdays = Schedule('weekdays 09:00-18:00')
+        weekends = Schedule('weekends 10:00-14:00')
+        daily = Schedule('daily 09:00-21:00')
+        for day in range(7):
+            self.assertEqual(weekdays.is_open(at(day, 12)), day < 5)
+            self.assertEqual(weekends.is_open(at(day, 12)), day >= 5)
+            self.assertTrue(daily.is_open(at(day, 20, 59)))
+        self.assertEqual(str(Schedule(Schedule.LEGAL)), 'daily 09:00-21:00')
+
+    def test_several_entries(self):
+        schedule = Schedule('mon-fri 09:00-20:00; sat 10:00-14:00; sun never')
+        self.assertTrue(schedule.is_open(at(4, 19)))
+        self.assertTrue(schedule.is_open(at(5, 13)))
+        self.assertFalse(schedule.is_open(at(5, 15)))
+        self.assertFalse(schedule.is_open(at(6, 12)))
+
+    def test_day_range_wraps_over_sunday(self):
+        schedule = Schedule('fri-mon 12:00-13:00')
+        self.assertEqual([schedule.is_open(at(day, 12)) for day in range(7)],
+                         [True, False, False, False, True, True, True])
+
+    def test_interval_past_midnight(self):
+        schedule = Schedule('fri 22:00-06:00')
+        self.assertTrue(schedule.is_open(at(4, 23)))
+        self.assertTrue(schedule.is_open(at(5, 5, 59)))
+        self.assertFalse(schedule.is_open(at(5, 6)))
+        self.assertFalse(schedule.is_open(at(4, 5)))
+
+    def test_sunday_night_continues_on_monday(self):
+        schedule = Schedule('sun 23:00-01:00')
+        self.assertTrue(schedule.is_open(at(6, 23, 30)))
+        self.assertTrue(schedule.is_open(at(0, 0, 30)))
+        self.assertFalse(schedule.is_open(at(0, 1)))
+
+    def test_whole_day(self):
+        schedule = Schedule('tue always; wed 00:00-24:00')
+        self.assertTrue(schedule.is_open(at(1, 0)))
+        self.assertTrue(schedule.is_open(at(2, 23, 59)))
+        self.assertFalse(schedule.is_open(at(3, 0)))
+
+    def test_holidays(self):
+        schedule = Schedule('daily 09:00-18:00; hol 10:00-12:00')
+        yearly = {'03-08'}
+        dated = {'2026-03-03'}
+        self.assertTrue(schedule.is_open(at(1, 9)))
+        self.assertFalse(schedule.is_open(at(1, 9), dated))
+        self.assertTrue(schedule.is_open(at(1, 11), dated))
+        self.assertFalse(schedule.is_open(at(6, 9), yearly))
+        self.assertTrue(schedule.is_open(at(6, 11), yearly))
+        self.assertEqual(Schedule.get_index(at(6, 0), yearly), Schedule.HOLIDAY * Schedule.DAY_MINUTES)
+
+    def test_holiday_night_does_not_leak_into_week(self):
+        schedule = Schedule('hol 22:00-06:00')
+        self.assertTrue(schedule.is_open(at(0, 23), {'2026-03-02'}))
+        self.assertFalse(schedule.is_open(at(1, 1)))
+        self.assertFalse(schedule.is_open(at(0, 1)))
+
+    def test_invalid_specs(self):
+        for spec in ['mon', 'mon 09:00', 'xyz 09:00-10:00', 'mon-xyz 09:00-10:00', 'mon 25:00-26:00',
+                     'mon 09:60-10:00', 'mon 09:00-24:30', 'mon-hol 09:00-10:00', 'mon 09:00-10:00 extra']:
+            with self.subTest(spec=spec):
+                with self.assertRaises(ValueError):
+                    Schedule(spec)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+try:
+    import mongomock
+    from com.novikov.rfid.SchemaMigrator import SchemaMigrator
+except ImportError:
+    mongomock = None
+
+from com.novikov.rfid.UserModel import UserModel
+
+
+__author__ = 'Ilia Novikov'
+
+
+@unittest.skipIf(mongomock is None, "нужны пакеты pymongo и mongomock")
+class SchemaMigratorTest(unittest.TestCase):
+    def setUp(self):
+        self.db = mongomock.MongoClient()['rfid']
+        self.users = self.db['users']
+
+    def test_empty_database_is_migrated_to_latest_version(self):
+        migrator = SchemaMigrator(self.db, 'users')
+        self.assertEqual(migrator.get_version(), 0)
+        migrator.migrate()
+        self.assertEqual(migrator.get_version(), len(migrator.migrations))
+        meta = self.db[SchemaMigrator.get_meta_name('users')].find_one({'_id': SchemaMigrator.SCHEMA_ID})
+        self.assertEqual([x['version'] for x in meta[SchemaMigrator.HISTORY]], [1, 2])
+
+    def test_legacy_id_is_moved_to_cards(self):
+        self.users.insert_many([{'ID': 'a', UserModel.NAME: 'first'}, {UserModel.CARDS: ['b']}])
+        SchemaMigrator(self.db, 'users').migrate()
+        self.assertEqual(self.users.find_one({UserModel.NAME: 'first'}), {
+            '_id': self.users.find_one({UserModel.NAME: 'first'})['_id'],
+            UserModel.NAME: 'first',
+            UserModel.CARDS: ['a']})
+        self.assertEqual(self.users.count_documents({'ID': {'$exists': True}}), 0)
+
+    def test_indexes_are_created(self):
+        SchemaMigrator(self.db, 'users').migrate()
+        keys = [x['key'][0][0] for x in self.users.index_information().values()]
+        self.assertTrue({UserModel.CARDS, UserModel.ACCESS, UserModel.EXPIRE} <= set(keys))
+
+    def test_current_schema_is_not_migrated_again(self):
+        SchemaMigrator(self.db, 'users').migrate()
+        self.users.insert_one({'ID': 'late'})
+        migrator = SchemaMigrator(self.db, 'users')
+        migrator.migrate()
+        self.assertEqual(self.users.count_documents({'ID': 'late'}), 1)
+        meta = self.db[SchemaMigrator.get_meta_name('users')].find_one({'_id': SchemaMigrator.SCHEMA_ID})
+        self.assertEqual(len(meta[SchemaMigrator.HISTORY]), len(migrator.migrations))
+
+    def test_only_new_migrations_run(self):
+        migrator = SchemaMigrator(self.db, 'users')
+        migrator.migrations = migrator.migrations[:1]
+        migrator.migrate()
+        self.users.insert_one({'ID': 'late'})
+        migrator = SchemaMigrator(self.db, 'users')
+        migrator.migrate()
+        self.assertEqual(migrator.get_version(), 2)
+        self.assertEqual(self.users.count_documents({'ID': 'late'}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
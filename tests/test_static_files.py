@@ -0,0 +1,103 @@
+from email.message import Message
+from email.utils import formatdate
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from com.novikov.server.StaticFiles import StaticFiles
+except ImportError:
+    StaticFiles = None
+
+
+__author__ = 'Ilia Novikov'
+
+
+def make_headers(**values):
+    headers = Message()
+    for name, value in values.items():
+        headers[name.replace('_', '-')] = value
+    return headers
+
+
+@unittest.skipIf(StaticFiles is None, "нужен пакет python-magic")
+class StaticFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.directory, 'css'))
+        self.filename = os.path.join(self.directory, 'css', 'main.css')
+        with open(self.filename, 'wb') as file:
+            file.write(b'0123456789')
+        self.static = StaticFiles(self.directory)
+        self.static.build()
+        self.entry = self.static.get('/css/main.css')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_manifest_entry(self):
+        self.assertEqual(self.entry['mime'], 'text/css')
+        self.assertEqual(self.entry['size'], 10)
+        self.assertIsNone(self.static.get('/css/missing.css'))
+        self.assertIsNone(self.static.get('/css/../../etc/passwd'))
+
+    def test_changed_file_is_described_again(self):
+        with open(self.filename, 'wb') as file:
+            file.write(b'changed content')
+        entry = self.static.get('/css/main.css')
+        self.assertEqual(entry['size'], 15)
+        self.assertNotEqual(entry['etag'], self.entry['etag'])
+
+    def test_removed_file_is_dropped(self):
+        os.remove(self.filename)
+        self.assertIsNone(self.static.get('/css/main.css'))
+
+    def test_range(self):
+        cases = [
+            ('bytes=0-3', (0, 4)),
+            ('bytes=5-', (5, 5)),
+            ('bytes=-3', (7, 3)),
+            ('bytes=-20', (0, 10)),
+            ('bytes=8-100', (8, 2)),
+            ('bytes=10-', False),
+            ('bytes=5-4', False),
+            ('bytes=-0', False),
+            ('bytes=0-1,4-5', None),
+            ('items=0-1', None),
+            ('bytes=a-b', None)
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(StaticFiles.get_range(self.entry, make_headers(Range=header)), expected)
+        self.assertIsNone(StaticFiles.get_range(self.entry, make_headers()))
+
+    def test_if_range(self):
+        headers = make_headers(Range='bytes=0-3', If_Range=self.entry['etag'])
+        self.assertEqual(StaticFiles.get_range(self.entry, headers), (0, 4))
+        headers = make_headers(Range='bytes=0-3', If_Range='"stale"')
+        self.assertIsNone(StaticFiles.get_range(self.entry, headers))
+
+    def test_if_none_match(self):
+        etag = self.entry['etag']
+        self.assertTrue(StaticFiles.is_not_modified(self.entry, make_headers(If_None_Match=etag)))
+        self.assertTrue(StaticFiles.is_not_modified(self.entry, make_headers(If_None_Match='"x", ' + etag)))
+        self.assertTrue(StaticFiles.is_not_modified(self.entry, make_headers(If_None_Match='*')))
+        self.assertFalse(StaticFiles.is_not_modified(self.entry, make_headers(If_None_Match='"x"')))
+
+    def test_if_modified_since(self):
+        mtime = self.entry['mtime'] // 10 ** 9
+        self.assertTrue(StaticFiles.is_not_modified(
+            self.entry, make_headers(If_Modified_Since=formatdate(mtime, usegmt=True))))
+        self.assertFalse(StaticFiles.is_not_modified(
+            self.entry, make_headers(If_Modified_Since=formatdate(mtime - 60, usegmt=True))))
+        self.assertFalse(StaticFiles.is_not_modified(self.entry, make_headers(If_Modified_Since='garbage')))
+        self.assertFalse(StaticFiles.is_not_modified(self.entry, make_headers()))
+
+    def test_if_none_match_takes_precedence(self):
+        headers = make_headers(If_None_Match='"x"', If_Modified_Since=formatdate(usegmt=True))
+        self.assertFalse(StaticFiles.is_not_modified(self.entry, headers))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+
+from com.novikov.rfid.UserCache import UserCache
+from com.novikov.rfid.UserModel import UserModel
+
+
+__author__ = 'Ilia Novikov'
+
+
+def make_model(object_id, cards, name='user'):
+    model = UserModel(cards=cards, name=name).get_model()
+    model[UserCache.ID] = object_id
+    return model
+
+
+class UserCacheTest(unittest.TestCase):
+    def test_get_counts_hits_and_misses(self):
+        cache = UserCache(4)
+        cache.put(make_model(1, ['a']))
+        self.assertEqual(cache.get('a').name, 'user')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = UserCache(0)
+        cache.put(make_model(1, ['a']))
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get('a'))
+
+    def test_least_recently_used_card_is_evicted(self):
+        cache = UserCache(2)
+        cache.put(make_model(1, ['a']))
+        cache.put(make_model(2, ['b']))
+        cache.get('a')
+        cache.put(make_model(3, ['c']))
+        self.assertEqual(sorted(cache.get_cards()), ['a', 'c'])
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.discard_id(2), [])
+
+    def test_partially_evicted_user_keeps_id(self):
+        cache = UserCache(2)
+        cache.put(make_model(1, ['a', 'b']))
+        cache.put(make_model(2, ['c']))
+        self.assertEqual(cache.get_cards(), ['b', 'c'])
+        self.assertEqual(cache.discard_id(1), ['a', 'b'])
+        self.assertEqual(cache.get_cards(), ['c'])
+
+    def test_put_replaces_user_by_id(self):
+        # Отвязанная карта не должна остаться в кэше после обновления пользователя
+        cache = UserCache(4)
+        cache.put(make_model(1, ['a', 'b']))
+        cache.put(make_model(1, ['b'], name='renamed'))
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b').name, 'renamed')
+
+    def test_discard_removes_all_cards_of_user(self):
+        cache = UserCache(4)
+        cache.put(make_model(1, ['a', 'b']))
+        cache.put(make_model(2, ['c']))
+        cache.discard(['a'])
+        self.assertEqual(cache.get_cards(), ['c'])
+        self.assertEqual(cache.discard_id(1), [])
+
+    def test_discard_unknown_id(self):
+        cache = UserCache(4)
+        self.assertEqual(cache.discard_id(42), [])
+
+    def test_cached_model_is_copied(self):
+        cache = UserCache(4)
+        model = make_model(1, ['a'])
+        cache.put(model)
+        model[UserModel.CARDS].append('b')
+        cache.get('a').cards.append('c')
+        self.assertEqual(cache.peek('a')[UserModel.CARDS], ['a'])
+
+    def test_peek_does_not_touch_order_or_stats(self):
+        cache = UserCache(2)
+        cache.put(make_model(1, ['a']))
+        cache.put(make_model(2, ['b']))
+        self.assertEqual(cache.peek('a')[UserCache.ID], 1)
+        self.assertIsNone(cache.peek('x'))
+        cache.put(make_model(3, ['c']))
+        self.assertEqual(cache.get_cards(), ['b', 'c'])
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+    def test_clear(self):
+        cache = UserCache(4)
+        cache.put(make_model(1, ['a']))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.discard_id(1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()